@@ -1,13 +1,29 @@
+import json
 import os
 import sys
+import time
 import traceback
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, request
 from flask_cors import CORS
 from dotenv import load_dotenv
-from backend_ucb_model import UCBTrainer
+from backend_ucb_model import UCBTrainer, QuestionBitset, QuestionCatalog
+from difficulty_policies import make_policy
+from item_selection import make_item_selector
+from calibration import EloCalibration
+from knowledge_tracing import KnowledgeTracer
+from cohort_priors import CohortPriors
+from placement import PlacementTest
+from review_scheduler import ReviewQueue, ReviewScheduler
+from singleflight import SingleFlight
+from grading import GradingCascade, normalize_code
 from python_question_bank import question_bank
-import re
+from response_encoding import json_response
+from result_store import ResultStore, ATTEMPT_DTYPE, SOURCE_ADAPTIVE, SOURCE_PLACEMENT, SOURCE_REVIEW
+import metrics
+import tracing
+import profiling
 import random
+import numpy as np
 
 # Configure error logging
 import logging
@@ -51,31 +67,72 @@ CORS(app)  # Enable CORS for all routes
 def handle_exception(e):
     logger.error(f"Uncaught exception: {e}")
     logger.error(traceback.format_exc())
-    return jsonify({
+    return json_response({
         "error": "Internal server error",
         "message": str(e)
     }), 500
 
+# Immutable question catalog shared by every question system in this worker
+question_catalog = QuestionCatalog(question_bank)
+
+# Columnar log of every checked answer, spilled chunk by chunk to ATTEMPT_LOG_DIR (disabled when unset)
+ATTEMPT_LOG_DIR = os.environ.get('ATTEMPT_LOG_DIR')
+attempt_log = ResultStore(ATTEMPT_DTYPE, chunk_size=4096, spill_dir=ATTEMPT_LOG_DIR,
+                          max_memory_chunks=0, prefix='attempts') if ATTEMPT_LOG_DIR else None
+
+# Difficulty policy shared by every question system in this worker (see difficulty_policies.py).
+# POLICY_CONFIG names a tuned config from tune_policy.py; DIFFICULTY_POLICY and
+# DIFFICULTY_POLICY_PARAMS override it.
+POLICY_CONFIG = os.environ.get('POLICY_CONFIG')
+policy_config = {}
+if POLICY_CONFIG:
+    with open(POLICY_CONFIG, 'r') as f:
+        policy_config = json.load(f)
+    logger.info(f"Loaded difficulty policy config from {POLICY_CONFIG}: {policy_config.get('policy')} "
+                f"{policy_config.get('params')}")
+DIFFICULTY_POLICY = os.environ.get('DIFFICULTY_POLICY', policy_config.get('policy', 'rules'))
+difficulty_policy_params = dict(policy_config.get('params', {})) if policy_config.get('policy') == DIFFICULTY_POLICY else {}
+difficulty_policy_params.update(json.loads(os.environ.get('DIFFICULTY_POLICY_PARAMS') or '{}'))
+difficulty_policy = make_policy(DIFFICULTY_POLICY, **difficulty_policy_params)
+
+# Online question difficulty calibration, optionally seeded from an offline fit (see calibration.py)
+CALIBRATION_FILE = os.environ.get('CALIBRATION_FILE')
+question_calibration = EloCalibration(question_catalog)
+if CALIBRATION_FILE and os.path.exists(CALIBRATION_FILE):
+    question_calibration.load(CALIBRATION_FILE)
+    logger.info(f"Loaded question calibration from {CALIBRATION_FILE}")
+
+# Question selector within a tier, with per-question statistics shared by every session (see item_selection.py)
+ITEM_SELECTOR = os.environ.get('ITEM_SELECTOR', 'random')
+item_selector_params = json.loads(os.environ.get('ITEM_SELECTOR_PARAMS') or '{}')
+if ITEM_SELECTOR == 'calibrated':
+    item_selector_params['calibration'] = question_calibration
+item_selector = make_item_selector(ITEM_SELECTOR, len(question_catalog), **item_selector_params)
+
+# Per-learner mastery of each question category (see knowledge_tracing.py)
+knowledge_tracer = KnowledgeTracer(len(question_catalog.category_names))
+# Serve questions from the learner's weakest category within the selected difficulty
+WEAK_CATEGORY_SELECTION = os.environ.get('WEAK_CATEGORY_SELECTION', '0') == '1'
+
+# Cohort statistics shared across workers, used to warm-start new sessions (see cohort_priors.py)
+cohort_priors = CohortPriors()
+
+# Start new sessions with a placement test (overridable per session with /api/init?placement=0|1)
+PLACEMENT_MODE = os.environ.get('PLACEMENT_MODE', '0') == '1'
+
+# Bring missed questions back for spaced review, interleaved with new questions (see review_scheduler.py)
+SPACED_REVIEW = os.environ.get('SPACED_REVIEW', '0') == '1'
+review_scheduler = ReviewScheduler()
+
 # Initialize the question system as a global variable
 question_system = None
 
-def normalize_code(code):
-    """
-    Normalize code by trimming whitespace from each line and keeping only non-empty lines.
-    This allows comparison of code regardless of indentation differences.
-    """
-    # Remove any special characters or color codes
-    code = re.sub(r'\x1b\[[0-9;]*[mGKH]', '', code)
-
-    # Process each line: trim whitespace and keep only non-empty lines
-    lines = []
-    for line in code.split('\n'):
-        trimmed = line.strip()
-        if trimmed:  # Only include non-empty lines
-            lines.append(trimmed)
-
-    return lines  # Return array of trimmed lines
+# Identical concurrent Gemini checks share one call, across workers when SINGLEFLIGHT_DIR is set
+gemini_flight = SingleFlight(name='gemini')
+# Local graders resolve confident cases; only uncertain answers reach Gemini (see grading.py)
+grading_cascade = GradingCascade(flight=gemini_flight)
 
+@tracing.traced('gemini_check_answer')
 def gemini_check_answer(user_answer, correct_answer, question_text):
     """
     Use Gemini AI to check if the user's answer is correct.
@@ -101,128 +158,269 @@ STUDENT'S ANSWER:
 Does the student's answer correctly fix the issue? Reply with ONLY 'Yes' or 'No'.
 """
         # Get response from Gemini
-        response = model.generate_content(prompt)
+        with metrics.time_block('gemini_request_duration_seconds'):
+            response = model.generate_content(prompt)
         result = response.text.strip().lower()
 
         # Parse response (looking for yes/no)
         if 'yes' in result:
+            metrics.inc('gemini_requests_total', outcome='ok')
             return True
         elif 'no' in result:
+            metrics.inc('gemini_requests_total', outcome='ok')
             return False
         else:
+            metrics.inc('gemini_requests_total', outcome='unclear')
             print(f"Unclear Gemini response: {result}")
             return None
     except Exception as e:
+        metrics.inc('gemini_requests_total', outcome='error')
         print(f"Error using Gemini: {e}")
         return None
 
+def gemini_grade(question, user_answer):
+    """LLM tier of the grading cascade"""
+    print("\nUsing AI to check your answer...")
+    return gemini_check_answer(user_answer, question.answer, question.text)
+
 class DebugQuestionSystem:
-    def __init__(self):
-        self.trainer = UCBTrainer()
-        for difficulty, questions in question_bank.items():
-            for q in questions:
-                self.trainer.add_question(q["id"], q["text"], q["answer"], difficulty)
+    def __init__(self, catalog=None, policy=None, selector=None, cohort=None, placement=False):
+        # Questions live in the shared immutable catalog; only learner state is allocated here
+        self.catalog = catalog if catalog is not None else question_catalog
+        self.item_selector = selector if selector is not None else item_selector
+        self.trainer = UCBTrainer(catalog=self.catalog)
+        # Random id distinguishing this session's records in the attempt log
+        self.session_id = random.getrandbits(63)
         self.current_question = None
-        self.current_difficulty = 0  # Start with Easy
+        # Difficulty policy state lives in one slot of the shared policy's arrays, allocated
+        # on the first adaptive answer (see _policy_slot)
+        self.policy = policy if policy is not None else difficulty_policy
+        self.policy_slot = None
+        self.policy_warm_start = None  # (difficulty, attempts, successes) applied to the slot once allocated
+        # Warm-start from the learner's cohort once it has enough settled sessions
+        self.cohort = cohort_priors.cohort_name(cohort)
+        start_difficulty = cohort_priors.starting_difficulty(self.cohort)
+        if start_difficulty is not None:
+            attempts, successes = cohort_priors.pseudo_counts(self.cohort)
+            self.policy_warm_start = (start_difficulty, attempts, successes)
+            self.trainer.agent.warm_start(attempts, successes)
+            self.current_difficulty = start_difficulty
+        else:
+            self.current_difficulty = self.policy.initial_difficulty()  # Easy for the default rules
+            if self.current_difficulty is None:
+                with self.policy.lock:
+                    self.current_difficulty = self.policy.select_one(self._policy_slot())
+        with knowledge_tracer.lock:
+            self.tracer_slot = knowledge_tracer.allocate()
         self.consecutive_correct = 0
         self.consecutive_wrong = 0
         # Add a counter for wrong attempts on the current question
         self.current_question_wrong_attempts = 0
+        # Whether the current question's first answer has been recorded (re-checks are not first attempts)
+        self.first_answer_recorded = False
+        # Highest hint level unlocked for the current question (0 = none)
+        self.hint_level_unlocked = 0
+        # Calibrated ability estimate (logit scale) and the number of answers behind it
+        self.ability = 0.0
+        self.ability_attempts = 0
+        # First attempts that went through normal adaptation (placement and reviews excluded)
+        self.adaptive_attempts = 0
+
+        # Placement test locating the learner's level before normal adaptation (None when off or finished)
+        self.placement = PlacementTest(question_calibration) if placement else None
+
+        # Pending reviews of missed questions, due after a number of served questions
+        self.reviews = ReviewQueue()
+        self.questions_served = 0
+        self.current_review_level = None  # Review level of the current question (None if not a review)
+
+        # Track used questions as a bitset over the catalog's dense question index
+        self.used_questions = QuestionBitset(len(self.catalog))
+
+        # Questions drawn in the current pass over each difficulty level (cleared per level
+        # once all its questions have been used) to ensure no repetition
+        self.drawn_questions = QuestionBitset(len(self.catalog))
+
+    def _policy_slot(self):
+        """This session's difficulty policy slot, allocated on first use (call with policy.lock held)"""
+        if self.policy_slot is None:
+            self.policy_slot = self.policy.allocate()
+            if self.policy_warm_start is not None:
+                self.policy.warm_start(self.policy_slot, *self.policy_warm_start)
+                self.policy_warm_start = None
+        return self.policy_slot
+
+    def close(self):
+        """Release this session's difficulty policy and knowledge tracing slots"""
+        if self.policy_slot is not None:
+            with self.policy.lock:
+                self.policy.release(self.policy_slot)
+                self.policy_slot = None
+        with knowledge_tracer.lock:
+            knowledge_tracer.release(self.tracer_slot)
 
-        # Track used question IDs
-        self.used_questions = set()
+    def get_next_question(self):
+        if self.placement is not None:
+            return self.get_placement_question()
 
-        # Create copies of question lists for each difficulty level to ensure no repetition
-        self.available_questions = {
-            0: list(self.trainer.questions[0]),  # Easy
-            1: list(self.trainer.questions[1]),  # Medium
-            2: list(self.trainer.questions[2]),  # Hard
-        }
+        # Due reviews alternate with new questions
+        if SPACED_REVIEW and self.current_review_level is None:
+            due = review_scheduler.next_due(self.reviews, self.questions_served)
+            if due is not None:
+                question_index, level = due
+                return self._serve(self.catalog.questions[question_index], review_level=level)
 
-    def get_next_question(self):
         # Select question for current difficulty
         difficulty = self.current_difficulty
+        tier = self.catalog.tier_indices[difficulty]
+        available = tier[~self.drawn_questions.contains_many(tier)]
 
         # If all questions at current difficulty have been used, reset questions for this level
-        if not self.available_questions[difficulty]:
+        if len(available) == 0:
             print(
                 f"\nAll {['Easy', 'Medium', 'Hard'][difficulty]} level questions have been used. Resetting question bank...")
-            self.available_questions[difficulty] = list(self.trainer.questions[difficulty])
+            self.drawn_questions.discard_many(tier)
+            available = tier
+
+        # Focus on the learner's least mastered category among the available questions
+        if WEAK_CATEGORY_SELECTION:
+            categories = self.catalog.category_codes[available]
+            weakest = knowledge_tracer.weakest_skill(self.tracer_slot, np.unique(categories))
+            available = available[categories == weakest]
+
+        # Select an unused question from current difficulty (uniformly at random by default)
+        question = self.catalog.questions[self.item_selector.select(available, ability=self.ability)]
+
+        return self._serve(question)
+
+    def get_placement_question(self):
+        """Most informative unseen question of any difficulty for the placement test"""
+        available = np.flatnonzero(~self.drawn_questions.to_mask(len(self.catalog)))
+        if len(available) == 0:
+            available = np.arange(len(self.catalog))
+        question = self.catalog.questions[self.placement.select(available)]
+        # Answers are logged and graded at the served question's own difficulty
+        self.current_difficulty = int(question.difficulty)
+        return self._serve(question)
 
-        # Randomly select an unused question from current difficulty
-        question = random.choice(self.available_questions[difficulty])
+    def _serve(self, question, review_level=None):
+        self.questions_served += 1
+        self.current_review_level = review_level
 
-        # Remove from available questions list
-        self.available_questions[difficulty].remove(question)
+        # Remove from available questions
+        self.drawn_questions.add(question.index)
 
         # Record current question
         self.current_question = question
+        metrics.inc('difficulty_selections_total', difficulty=['Easy', 'Medium', 'Hard'][question.difficulty])
 
-        # Add to used questions set
-        self.used_questions.add(question.id)
+        # Mark as used in the seen-set
+        self.used_questions.add(question.index)
 
-        # Reset wrong attempts counter when getting a new question
+        # Reset wrong attempts counter and hint progress when getting a new question
         self.current_question_wrong_attempts = 0
+        self.first_answer_recorded = False
+        self.hint_level_unlocked = 0
 
         return self.format_question(question)
 
     def format_question(self, question):
         difficulty_names = ["Easy", "Medium", "Hard"]
 
-        # Extract hints from question bank
-        question_data = None
-        for difficulty, questions in question_bank.items():
-            for q in questions:
-                if q["id"] == question.id:
-                    question_data = q
-                    break
-            if question_data:
-                break
-
-        # Include hints if available
-        hints = []
-        if question_data and "hints" in question_data:
-            if isinstance(question_data["hints"], dict):
-                # If hints are stored as a dictionary with levels
-                hints = [
-                    question_data["hints"].get("level1", ""),
-                    question_data["hints"].get("level2", ""),
-                    question_data["hints"].get("level3", "")
-                ]
-            elif isinstance(question_data["hints"], list):
-                # If hints are stored as a list
-                hints = question_data["hints"]
-
+        # Hint texts are served on demand by get_hint; only advertise how many levels exist
         return {
             "difficulty": difficulty_names[question.difficulty],
             "id": question.id,
             "text": question.text,
-            "hints": hints  # Add hints to the response
+            "hint_levels": len(self.catalog.hints[question.index])
+        }
+
+    def get_hint(self, level=None):
+        """Unlock and return a hint for the current question.
+
+        Levels must be unlocked in order; requesting an already unlocked level returns it again.
+        Without a level, the next locked level is returned.
+        """
+        if not self.current_question:
+            raise ValueError("No active question")
+
+        hints = self.catalog.hints[self.current_question.index]
+        if not hints:
+            raise ValueError("No hints available for this question")
+        if level is None:
+            level = min(self.hint_level_unlocked + 1, len(hints))
+        if level < 1 or level > len(hints):
+            raise ValueError(f"Hint level must be between 1 and {len(hints)}")
+        if level > self.hint_level_unlocked + 1:
+            raise ValueError(f"Hint level {self.hint_level_unlocked + 1} must be unlocked first")
+
+        if level > self.hint_level_unlocked:
+            self.hint_level_unlocked = level
+            logger.info(f"Hint level {level} unlocked for question {self.current_question.id}")
+
+        return {
+            "id": self.current_question.id,
+            "level": level,
+            "hint": hints[level - 1],
+            "remaining_levels": len(hints) - self.hint_level_unlocked
         }
 
     def check_answer(self, user_answer):
         if not self.current_question:
             return False, False
 
-        # First try Gemini-based checking if available
-        if GEMINI_AVAILABLE:
-            print("\nUsing AI to check your answer...")
-            gemini_result = gemini_check_answer(
-                user_answer,
-                self.current_question.answer,
-                self.current_question.text
-            )
-
-            if gemini_result is not None:
-                is_correct = gemini_result
-                print(f"AI assessment: {'Correct' if is_correct else 'Incorrect'}")
+        grading_start = time.perf_counter()
+
+        question = self.current_question
+        verdict = grading_cascade.grade(
+            question,
+            user_answer,
+            fallback=lambda: self.traditional_check(user_answer),
+            llm=gemini_grade if GEMINI_AVAILABLE else None
+        )
+        is_correct = verdict.correct
+        grading_path = verdict.tier
+        print(f"Graded by {grading_path} (confidence {verdict.confidence:.2f}): {'Correct' if is_correct else 'Incorrect'}")
+
+        metrics.inc('grading_total', path=grading_path)
+        metrics.observe('grading_confidence', verdict.confidence, path=grading_path)
+        metrics.observe('grading_duration_seconds', time.perf_counter() - grading_start, path=grading_path)
+
+        # Per-question statistics and calibration only count first attempts
+        first_attempt = not self.first_answer_recorded
+
+        if attempt_log is not None:
+            if self.current_review_level is not None:
+                source = SOURCE_REVIEW
+            elif self.placement is not None:
+                source = SOURCE_PLACEMENT
             else:
-                # Fall back to traditional checking if Gemini fails
-                print("AI check failed, falling back to standard checking")
-                is_correct = self.traditional_check(user_answer)
-        else:
-            # Use traditional checking
-            is_correct = self.traditional_check(user_answer)
+                source = SOURCE_ADAPTIVE
+            attempt_log.append({
+                'timestamp': time.time(),
+                'session_id': self.session_id,
+                'question_key': self.catalog.keys[self.current_question.index],
+                'difficulty': self.current_question.difficulty,
+                'is_correct': is_correct,
+                'hint_level': self.hint_level_unlocked,
+                'wrong_attempts': self.current_question_wrong_attempts,
+                'first_attempt': first_attempt,
+                'source': source
+            })
+
+        if first_attempt:
+            self.first_answer_recorded = True
+            self.item_selector.update(self.current_question.index, is_correct)
+            self.ability = question_calibration.update(self.current_question.index, self.ability,
+                                                       self.ability_attempts, is_correct)
+            self.ability_attempts += 1
+            cohort_priors.record_answer(self.cohort, self.current_question.difficulty, is_correct)
+            with knowledge_tracer.lock:
+                knowledge_tracer.update_one(self.tracer_slot, self.catalog.category_codes[self.current_question.index],
+                                            is_correct)
+            if SPACED_REVIEW:
+                review_scheduler.record(self.reviews, self.current_question.index, is_correct,
+                                        self.questions_served, self.current_review_level)
 
         # Update model based on result
         if is_correct:
@@ -230,39 +428,71 @@ class DebugQuestionSystem:
             self.consecutive_wrong = 0
             # Reset wrong attempts counter on correct answer
             self.current_question_wrong_attempts = 0
-            # Update UCB model state
-            self.trainer.agent.update(self.current_difficulty, 1.0)
-
-            # Upgrade difficulty after two consecutive correct answers
-            if self.consecutive_correct >= 2 and self.current_difficulty < 2:
-                self.current_difficulty += 1
-                self.consecutive_correct = 0  # Reset consecutive counter after upgrade
-                print(
-                    f"\nCongratulations! You've answered two questions correctly in a row. Difficulty upgraded to {['Easy', 'Medium', 'Hard'][self.current_difficulty]}!")
         else:
             self.consecutive_wrong += 1
             self.consecutive_correct = 0
             # Increment wrong attempts counter
             self.current_question_wrong_attempts += 1
-            # Update UCB model state
-            self.trainer.agent.update(self.current_difficulty, 0.0)
-
-            # Downgrade difficulty immediately after wrong answer (if not at lowest difficulty)
-            if self.current_difficulty > 0:
-                old_difficulty = self.current_difficulty
-                self.current_difficulty -= 1
-                print(
-                    f"\nDifficulty downgraded from {['Easy', 'Medium', 'Hard'][old_difficulty]} to {['Easy', 'Medium', 'Hard'][self.current_difficulty]}")
-
-            # Check if wrong attempts threshold is reached
-            if self.current_question_wrong_attempts >= 3:
-                print("\nYou've attempted this question 3 times without success. Moving to the next question...")
-                # Return a flag to indicate we should move to the next question
-                return is_correct, True
+
+        # Reviews may come from another tier, so they do not move the difficulty
+        if self.current_review_level is not None:
+            return is_correct, not is_correct and self.current_question_wrong_attempts >= 3
+
+        # During placement answers refine the ability posterior instead of moving the difficulty
+        if self.placement is not None:
+            self.placement.update(self.current_question.index, is_correct)
+            if self.placement.done:
+                self.finish_placement()
+            # Retries carry little information about the level, so wrong answers move on right away
+            return is_correct, not is_correct
+
+        # Update UCB model state
+        with tracing.span('UCBDifficultyAgent.update'):
+            self.trainer.agent.update(self.current_difficulty, 1.0 if is_correct else 0.0)
+
+        # The configured difficulty policy picks the next difficulty
+        with tracing.span('difficulty_policy'), self.policy.lock:
+            slot = self._policy_slot()
+            self.policy.update_one(slot, self.current_difficulty, is_correct, hint_levels=self.hint_level_unlocked)
+            next_difficulty = self.policy.select_one(slot)
+
+        difficulty_names = ['Easy', 'Medium', 'Hard']
+        if next_difficulty > self.current_difficulty:
+            self.consecutive_correct = 0  # Reset consecutive counter after upgrade
+            print(f"\nCongratulations! Difficulty upgraded to {difficulty_names[next_difficulty]}!")
+        elif next_difficulty < self.current_difficulty:
+            print(f"\nDifficulty downgraded from {difficulty_names[self.current_difficulty]} to {difficulty_names[next_difficulty]}")
+        self.current_difficulty = next_difficulty
+
+        # The level reached after the first few adaptive answers feeds the cohort's starting difficulty
+        if first_attempt:
+            self.adaptive_attempts += 1
+            if self.adaptive_attempts == cohort_priors.settle_after:
+                cohort_priors.record_settled(self.cohort, self.current_difficulty)
+
+        # Check if wrong attempts threshold is reached
+        if not is_correct and self.current_question_wrong_attempts >= 3:
+            print("\nYou've attempted this question 3 times without success. Moving to the next question...")
+            # Return a flag to indicate we should move to the next question
+            return is_correct, True
 
         # Default return with the correct/incorrect status and no question change flag
         return is_correct, False
 
+    def finish_placement(self):
+        """Start normal adaptation at the level found by the placement test"""
+        level = self.placement.level()
+        logger.info(f"Placement finished after {self.placement.answered} answers: "
+                    f"ability {self.placement.mean:+.2f}, starting at {['Easy', 'Medium', 'Hard'][level]}")
+        self.ability = self.placement.mean
+        self.placement = None
+        with self.policy.lock:
+            self.policy.set_difficulty(self._policy_slot(), level)
+        self.current_difficulty = level
+        self.consecutive_correct = 0
+        self.consecutive_wrong = 0
+
+    @tracing.traced('traditional_check')
     def traditional_check(self, user_answer):
         """Traditional string-based answer checking as fallback"""
         # Get normalized lines from both answers (strips whitespace, removes empty lines)
@@ -309,7 +539,12 @@ class DebugQuestionSystem:
             "current_difficulty": difficulty_names[self.current_difficulty],
             "consecutive_correct": self.consecutive_correct,
             "consecutive_wrong": self.consecutive_wrong,
-            "questions_used": len(self.used_questions)
+            "questions_used": self.used_questions.count(),
+            "ability": round(self.ability, 3),
+            "mastery": {
+                name: round(float(mastery), 3)
+                for name, mastery in zip(self.catalog.category_names, knowledge_tracer.mastery[self.tracer_slot])
+            }
         }
 
 # Add a health check endpoint
@@ -322,7 +557,7 @@ def health_check():
             "PORT": os.getenv('PORT', 'default:5000'),
             "ENVIRONMENT": os.getenv('ENVIRONMENT', 'development'),
         }
-        return jsonify({
+        return json_response({
             'status': 'healthy',
             'environment': env_vars,
             'gemini_available': GEMINI_AVAILABLE,
@@ -330,45 +565,65 @@ def health_check():
         }), 200
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return jsonify({'status': 'degraded', 'error': str(e)}), 500
+        return json_response({'status': 'degraded', 'error': str(e)}), 500
 
 # API Routes
 @app.route('/api/init', methods=['GET'])
 def initialize_system():
     try:
         global question_system
-        question_system = DebugQuestionSystem()
+        if question_system is not None:
+            question_system.close()
+        placement = request.args.get('placement')
+        question_system = DebugQuestionSystem(cohort=request.args.get('cohort'),
+                                              placement=PLACEMENT_MODE if placement is None else placement == '1')
+        metrics.set_gauge('active_sessions', 1)
         # Get total number of questions for each difficulty level
         total_counts = {
-            "Easy": len(question_system.trainer.questions[0]),
-            "Medium": len(question_system.trainer.questions[1]),
-            "Hard": len(question_system.trainer.questions[2])
+            "Easy": question_system.catalog.tier_size(0),
+            "Medium": question_system.catalog.tier_size(1),
+            "Hard": question_system.catalog.tier_size(2)
         }
         logger.info(f"System initialized with {sum(total_counts.values())} total questions")
-        return jsonify({
+        return json_response({
             "status": "initialized",
-            "question_counts": total_counts
+            "question_counts": total_counts,
+            "cohort": question_system.cohort,
+            "start_difficulty": ["Easy", "Medium", "Hard"][question_system.current_difficulty]
         })
     except Exception as e:
         logger.error(f"System initialization failed: {e}")
         logger.error(traceback.format_exc())
-        return jsonify({"error": f"Failed to initialize system: {str(e)}"}), 500
+        return json_response({"error": f"Failed to initialize system: {str(e)}"}), 500
 
 @app.route('/api/question', methods=['GET'])
 def get_next_question():
     if not question_system:
-        return jsonify({"error": "System not initialized"}), 400
+        return json_response({"error": "System not initialized"}), 400
     question_data = question_system.get_next_question()
-    return jsonify(question_data)
+    # Formatted questions are static per id, so their encoded/compressed bodies are cached
+    return json_response(question_data, cache_key=('question', question_data['id']))
+
+@app.route('/api/hint', methods=['GET'])
+def get_hint():
+    if not question_system:
+        return json_response({"error": "System not initialized"}), 400
+
+    level = request.args.get('level', type=int)
+    try:
+        hint_data = question_system.get_hint(level)
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+    return json_response(hint_data)
 
 @app.route('/api/check', methods=['POST'])
 def check_answer():
     if not question_system:
-        return jsonify({"error": "System not initialized"}), 400
+        return json_response({"error": "System not initialized"}), 400
 
     data = request.json
     if not data or 'answer' not in data:
-        return jsonify({"error": "Answer missing"}), 400
+        return json_response({"error": "Answer missing"}), 400
 
     user_answer = data['answer']
 
@@ -384,12 +639,14 @@ def check_answer():
     next_difficulty = question_system.get_next_difficulty()
     difficulty_names = ["Easy", "Medium", "Hard"]
 
-    return jsonify({
+    return json_response({
         "correct": is_correct,
         "consecutive_correct": question_system.consecutive_correct,
         "consecutive_wrong": question_system.consecutive_wrong,
         "next_difficulty": difficulty_names[next_difficulty],
-        "stats": question_system.get_stats(),
+        "placement_active": question_system.placement is not None,
+        # Only the stat not already reported above (the rest is available from /api/stats)
+        "questions_used": question_system.used_questions.count(),
         # Add a new field to indicate if the frontend should automatically fetch a new question
         "auto_next": should_next_question
     })
@@ -397,9 +654,96 @@ def check_answer():
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     if not question_system:
-        return jsonify({"error": "System not initialized"}), 400
+        return json_response({"error": "System not initialized"}), 400
+
+    return json_response(question_system.get_stats())
 
-    return jsonify(question_system.get_stats())
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus scrape endpoint, aggregated across gunicorn workers
+    return Response(metrics.render_latest(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Sampled requests (or admin "X-Trace: 1" ones) record spans through the pipeline
+    forced = request.headers.get('X-Trace') == '1' and profiling.is_admin(request.headers.get('X-Admin-Token'))
+    tracing.start_trace(f"{request.method} {request.path}", force=forced)
+    # Opt-in sampled profiling (every N-th request, or admin "X-Profile: 1" header)
+    if profiling.should_profile(request.headers):
+        g.profiler = profiling.start()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - start,
+                        route=route, method=request.method, status=response.status_code)
+    metrics.flush()
+    cohort_priors.start_sync()
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiling.record(request.url_rule.rule if request.url_rule else 'unmatched', profiler)
+
+    trace = tracing.finish_trace(status=response.status_code)
+    if trace is not None:
+        response.headers['X-Trace-Id'] = trace.trace_id
+    return response
+
+@app.teardown_request
+def finish_unfinished_trace(exc):
+    # Requests that failed before after_request still export their spans
+    tracing.finish_trace()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    # Inspect or reconfigure this worker's request profiler at runtime
+    if not profiling.is_admin(request.headers.get('X-Admin-Token')):
+        return json_response({"error": "Forbidden"}), 403
+
+    response = {}
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if 'sample_every' in data:
+            sample_every = data['sample_every']
+            if isinstance(sample_every, bool) or not isinstance(sample_every, int) or sample_every < 0:
+                return json_response({"error": "sample_every must be a non-negative integer"}), 400
+            profiling.set_sample_every(sample_every)
+        if data.get('dump'):
+            response["dumped"] = profiling.dump()
+        if data.get('reset'):
+            profiling.reset()
+
+    response.update({
+        "pid": os.getpid(),
+        "sample_every": profiling.sample_every,
+        "routes": profiling.summary()
+    })
+    return json_response(response)
+
+@app.route('/api/admin/profile/flamegraph', methods=['GET'])
+def admin_profile_flamegraph():
+    # Collapsed stacks for flamegraph.pl / speedscope, optionally for one route
+    if not profiling.is_admin(request.headers.get('X-Admin-Token')):
+        return json_response({"error": "Forbidden"}), 403
+    return Response(profiling.collapsed(request.args.get('route')), content_type='text/plain; charset=utf-8')
+
+@app.route('/api/admin/calibration', methods=['GET'])
+def admin_calibration():
+    # Questions whose online-calibrated difficulty falls in another bucket (this worker's view)
+    if not profiling.is_admin(request.headers.get('X-Admin-Token')):
+        return json_response({"error": "Forbidden"}), 403
+    min_attempts = request.args.get('min_attempts', default=20, type=int)
+    return json_response({
+        "pid": os.getpid(),
+        "attempts": int(question_calibration.attempts.sum()),
+        "misbucketed": question_calibration.misbucketed(min_attempts)
+    })
 
 # Make sure the question system persists across sessions
 @app.before_request
@@ -407,7 +751,8 @@ def ensure_question_system():
     try:
         global question_system
         if question_system is None:
-            question_system = DebugQuestionSystem()
+            question_system = DebugQuestionSystem(placement=PLACEMENT_MODE)
+            metrics.set_gauge('active_sessions', 1)
             logger.info("Question system initialized before request")
     except Exception as e:
         logger.error(f"Failed to initialize question system: {e}")
@@ -2,16 +2,181 @@ import numpy as np
 from math import log, sqrt
 import json
 import random
+from result_store import ResultStore, TRAINING_RESULT_DTYPE, question_key
+
+# Number of set bits for every possible byte value (used for fast popcount)
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
 
 
 class Question:
     """Question class representing a single debugging problem"""
 
-    def __init__(self, id, text, answer, difficulty):
+    __slots__ = ('id', 'text', 'answer', 'difficulty', 'index')
+
+    def __init__(self, id, text, answer, difficulty, index=None):
         self.id = id
         self.text = text  # Question content
         self.answer = answer  # Correct answer
         self.difficulty = difficulty  # Difficulty level: 0=Easy, 1=Medium, 2=Hard
+        self.index = index  # Dense integer position in the question catalog
+
+
+class QuestionBitset:
+    """Compact seen/unseen set over dense question indices, one bit per question"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, n_questions=0):
+        self.bits = np.zeros((n_questions + 7) // 8, dtype=np.uint8)
+
+    def _ensure_capacity(self, index):
+        """Grow the bit array so that it can hold the given index"""
+        n_bytes = (index >> 3) + 1
+        if n_bytes > len(self.bits):
+            self.bits = np.concatenate([self.bits, np.zeros(n_bytes - len(self.bits), dtype=np.uint8)])
+
+    def add(self, index):
+        """Mark a question index as seen"""
+        self._ensure_capacity(index)
+        self.bits[index >> 3] |= 1 << (index & 7)
+
+    def discard(self, index):
+        """Mark a question index as unseen"""
+        if (index >> 3) < len(self.bits):
+            self.bits[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def discard_many(self, indices):
+        """Mark an array of question indices as unseen"""
+        indices = np.asarray(indices, dtype=np.int64)
+        indices = indices[(indices >> 3) < len(self.bits)]
+        np.bitwise_and.at(self.bits, indices >> 3, (~(1 << (indices & 7)) & 0xFF).astype(np.uint8))
+
+    def contains_many(self, indices):
+        """Vectorized membership test for an array of question indices (out-of-range ones are unseen)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        in_range = (indices >> 3) < len(self.bits)
+        if in_range.all():
+            return ((self.bits[indices >> 3] >> (indices & 7)) & 1).astype(bool)
+        found = np.zeros(len(indices), dtype=bool)
+        inside = indices[in_range]
+        found[in_range] = (self.bits[inside >> 3] >> (inside & 7)) & 1
+        return found
+
+    def __contains__(self, index):
+        if (index >> 3) >= len(self.bits):
+            return False
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        """Number of seen questions (popcount over the packed bytes)"""
+        return int(_POPCOUNT_TABLE[self.bits].sum(dtype=np.int64))
+
+    def clear(self):
+        """Mark every question as unseen"""
+        self.bits[:] = 0
+
+    def to_mask(self, n_questions):
+        """Unpack into a NumPy bool array of length n_questions (questions beyond the bitset are unseen)"""
+        mask = np.zeros(n_questions, dtype=bool)
+        unpacked = np.unpackbits(self.bits, bitorder='little')[:n_questions]
+        mask[:len(unpacked)] = unpacked
+        return mask
+
+    def to_bytes(self):
+        """Serialize the packed bits"""
+        return self.bits.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Restore a bitset serialized with to_bytes"""
+        bitset = cls()
+        bitset.bits = np.frombuffer(data, dtype=np.uint8).copy()
+        return bitset
+
+
+class QuestionCatalog:
+    """Immutable struct-of-arrays question catalog shared by all learner systems.
+
+    Every question is addressed by a dense integer index; per-question fields are
+    stored column-wise so learner state only needs to hold integer references.
+    """
+
+    def __init__(self, question_bank):
+        ids, texts, answers, difficulties = [], [], [], []
+        categories, knowledge_points, hints = [], [], []
+        for difficulty in sorted(question_bank):
+            for q in question_bank[difficulty]:
+                ids.append(q["id"])
+                texts.append(q["text"])
+                answers.append(q["answer"])
+                difficulties.append(difficulty)
+                categories.append(q.get("category", ""))
+                knowledge_points.append(q.get("knowledge_point", ""))
+                hints.append(self._normalize_hints(q.get("hints")))
+
+        self.ids = tuple(ids)
+        self.texts = tuple(texts)
+        self.answers = tuple(answers)
+        self.difficulties = np.array(difficulties, dtype=np.int8)
+        self.knowledge_points = tuple(knowledge_points)
+        self.hints = tuple(hints)  # Tuple of hint levels per question
+
+        # Categories are stored as small integer codes into category_names
+        self.category_names = tuple(sorted(set(categories)))
+        category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self.category_codes = np.array([category_codes[c] for c in categories], dtype=np.int16)
+
+        # Question id -> dense index
+        self.index = {question_id: i for i, question_id in enumerate(self.ids)}
+
+        # Stable per-question keys used in attempt logs, sorted for lookup
+        self.keys = np.array([question_key(question_id) for question_id in self.ids], dtype=np.uint64)
+        self._key_order = np.argsort(self.keys)
+        self._sorted_keys = self.keys[self._key_order]
+
+        # Dense indices of the questions in each difficulty tier
+        self.n_difficulties = len(question_bank)
+        self.tier_indices = {
+            d: np.flatnonzero(self.difficulties == d).astype(np.int32)
+            for d in range(self.n_difficulties)
+        }
+
+        # One shared Question object per catalog entry
+        self.questions = tuple(
+            Question(ids[i], texts[i], answers[i], difficulties[i], index=i) for i in range(len(ids))
+        )
+        self.questions_by_difficulty = {
+            d: tuple(self.questions[i] for i in self.tier_indices[d]) for d in range(self.n_difficulties)
+        }
+
+    def indices_for_keys(self, keys):
+        """Dense indices of logged question keys (-1 for questions no longer in the catalog)"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.intp)
+        position = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self.keys) - 1)
+        return np.where(self._sorted_keys[position] == keys, self._key_order[position], -1).astype(np.intp)
+
+    @staticmethod
+    def _normalize_hints(hints):
+        """Return hints as a tuple ordered by level"""
+        if isinstance(hints, dict):
+            # Hints stored as a dictionary with levels
+            return (hints.get("level1", ""), hints.get("level2", ""), hints.get("level3", ""))
+        if isinstance(hints, list):
+            # Hints stored as a list
+            return tuple(hints)
+        return ()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tier_size(self, difficulty):
+        """Number of questions at a difficulty level"""
+        return len(self.tier_indices[difficulty])
 
 
 class UCBDifficultyAgent:
@@ -37,6 +202,13 @@ class UCBDifficultyAgent:
         # Track consecutive correct answers (overall, not per difficulty)
         self.consecutive_correct_count = 0
 
+    def warm_start(self, counts, rewards):
+        """Start from pseudo-counts (e.g. cohort priors) instead of zeroed statistics"""
+        self.counts = np.array(counts, dtype=float)
+        self.rewards = np.array(rewards, dtype=float)
+        self.values = np.divide(self.rewards, self.counts, out=np.zeros(self.n_difficulties), where=self.counts > 0)
+        self.total_count = int(round(self.counts.sum()))
+
     def select_difficulty(self):
         """Select difficulty based on UCB and force upgrade after two consecutive correct answers"""
         # Force difficulty upgrade after two consecutive correct answers
@@ -168,18 +340,34 @@ class UCBDifficultyAgent:
 class UCBTrainer:
     """UCB model trainer"""
 
-    def __init__(self):
-        self.questions = {
-            0: [],  # Easy questions
-            1: [],  # Medium questions
-            2: []  # Hard questions
-        }
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        if catalog is not None:
+            # Reference the shared catalog's questions instead of copying them
+            self.questions = dict(catalog.questions_by_difficulty)
+            self.question_index = catalog.index
+        else:
+            self.questions = {
+                0: [],  # Easy questions
+                1: [],  # Medium questions
+                2: []  # Hard questions
+            }
+            # Dense integer index over every added question (question id -> position)
+            self.question_index = {}
         self.agent = UCBDifficultyAgent(n_difficulties=3)
-        self.results = []
+        # Columnar per-step results (question referenced by dense index)
+        self.results = ResultStore(TRAINING_RESULT_DTYPE)
 
     def add_question(self, id, text, answer, difficulty):
         """Add question to bank"""
-        question = Question(id, text, answer, difficulty)
+        if self.catalog is not None:
+            # Detach from the shared catalog before mutating the question lists
+            self.questions = {d: list(qs) for d, qs in self.questions.items()}
+            self.question_index = dict(self.question_index)
+            self.catalog = None
+
+        question = Question(id, text, answer, difficulty, index=len(self.question_index))
+        self.question_index[id] = question.index
         self.questions[difficulty].append(question)
 
     def train_step(self, correct_prob=None):
@@ -224,7 +412,7 @@ class UCBTrainer:
             'reward': reward,
             'consecutive_correct': self.agent.consecutive_correct_count
         }
-        self.results.append(result)
+        self.results.append(dict(result, question_index=question.index))
 
         return result
 
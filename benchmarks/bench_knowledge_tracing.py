@@ -0,0 +1,56 @@
+"""
+Throughput benchmark for vectorized Bayesian Knowledge Tracing updates.
+
+Updates batches of learners (one answer each, random category and outcome)
+and reports learner-updates per second for each batch size. The target for
+the serving and simulation paths is 1M learner-updates/sec.
+
+Usage:
+  python benchmarks/bench_knowledge_tracing.py [--learners 1000000] [--batches 1000,100000,1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from knowledge_tracing import KnowledgeTracer  # noqa: E402
+
+TARGET_UPDATES_PER_SEC = 1_000_000
+
+
+def bench(tracer, batch_size, rng, min_time=1.0):
+    """Learner-updates per second for batches of batch_size distinct learners"""
+    slots = rng.permutation(tracer.capacity)[:batch_size]
+    skills = rng.integers(0, tracer.n_skills, batch_size)
+    correct = rng.random(batch_size) < 0.6
+    updates = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_time:
+        tracer.update(slots, skills, correct)
+        updates += batch_size
+    return updates / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BKT update throughput")
+    parser.add_argument('--learners', type=int, default=1_000_000, help='Learners held by the tracer')
+    parser.add_argument('--skills', type=int, default=6, help='Categories per learner')
+    parser.add_argument('--batches', default='1,1000,100000,1000000', help='Comma-separated batch sizes')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tracer = KnowledgeTracer(args.skills, capacity=args.learners)
+    print(f"{args.learners} learners x {args.skills} skills, "
+          f"{tracer.mastery.nbytes / 1e6:.1f} MB of mastery state")
+    print(f"{'batch':>10} {'updates/s':>14}")
+    for batch_size in (int(b) for b in args.batches.split(',')):
+        rate = bench(tracer, min(batch_size, args.learners), rng)
+        flag = '' if rate >= TARGET_UPDATES_PER_SEC else '  (below target)'
+        print(f"{batch_size:>10} {rate:>14,.0f}{flag}")
+
+
+if __name__ == '__main__':
+    main()
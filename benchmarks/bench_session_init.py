@@ -0,0 +1,78 @@
+"""
+Benchmark for per-session construction of DebugQuestionSystem.
+
+Compares the current construction (learner state over a shared QuestionCatalog)
+with the previous approach (a fresh UCBTrainer re-adding every question and
+copying the per-difficulty lists) across growing question banks, reporting
+wall time and allocated bytes per session.
+
+Usage: python benchmarks/bench_session_init.py [--sizes 24,1000,10000,100000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import DebugQuestionSystem  # noqa: E402
+from backend_ucb_model import QuestionCatalog, UCBTrainer  # noqa: E402
+from python_question_bank import question_bank  # noqa: E402
+
+
+def build_bank(n_questions):
+    """Build a synthetic bank of n_questions by cycling through the real one"""
+    source = [(d, q) for d, qs in question_bank.items() for q in qs]
+    bank = {d: [] for d in question_bank}
+    for i in range(n_questions):
+        difficulty, q = source[i % len(source)]
+        bank[difficulty].append(dict(q, id=f"{q['id']}_{i}"))
+    return bank
+
+
+def legacy_session(bank):
+    """Previous construction: rebuild the trainer and copy the question lists"""
+    trainer = UCBTrainer()
+    for difficulty, questions in bank.items():
+        for q in questions:
+            trainer.add_question(q["id"], q["text"], q["answer"], difficulty)
+    available = {d: list(trainer.questions[d]) for d in trainer.questions}
+    return trainer, available, set()
+
+
+def measure(factory, repeat):
+    """Return (microseconds per call, bytes allocated per call)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        factory()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = factory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del keep
+    return elapsed * 1e6, allocated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='24,1000,10000,100000', help='Comma-separated bank sizes')
+    parser.add_argument('--repeat', type=int, default=200, help='Constructions timed per size')
+    args = parser.parse_args()
+
+    print(f"\n{'questions':>10} | {'shared us':>10} {'shared B':>10} | {'legacy us':>10} {'legacy B':>12}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        bank = build_bank(size)
+        catalog = QuestionCatalog(bank)
+        shared_us, shared_bytes = measure(lambda: DebugQuestionSystem(catalog), args.repeat)
+        legacy_repeat = max(1, args.repeat * 24 // max(size, 24))
+        legacy_us, legacy_bytes = measure(lambda: legacy_session(bank), legacy_repeat)
+        print(f"{size:>10} | {shared_us:>10.1f} {shared_bytes:>10} | {legacy_us:>10.1f} {legacy_bytes:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+Load-test harness for the /api/* endpoints.
+
+For every worker/thread configuration, starts a local gunicorn server running
+benchmarks/stub_server.py (the real app with a stubbed grader), then drives it
+with simulated learners. Each learner calls /api/init once, then loops over
+/api/question and /api/check. It submits the reference answer with the same
+per-difficulty probabilities UCBTrainer.train_step uses by default
+(Easy=0.8, Medium=0.5, Hard=0.3) and a wrong answer otherwise.
+
+Reports throughput and p50/p95/p99 latency per endpoint and configuration.
+Results can be saved as JSON and compared against a stored baseline to catch
+regressions.
+
+Limitation: the app keeps a single global question system per worker, and
+/api/init replaces it. Concurrent learners on the same worker therefore
+overwrite each other's session: a learner's /api/check may grade against a
+question another learner was served. The numbers measure request cost under
+that shared state, not independent user sessions.
+
+Usage:
+  python benchmarks/load_test.py --configs 1x1,2x2,4x2 --learners 16 --duration 20
+  python benchmarks/load_test.py --output results.json
+  python benchmarks/load_test.py --baseline results.json --tolerance 0.2
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from python_question_bank import question_bank  # noqa: E402
+
+# Endpoints with fewer samples than this are not compared against the baseline
+MIN_COMPARE_SAMPLES = 20
+
+# Same default correctness as UCBTrainer.train_step
+CORRECT_PROBS = {"Easy": 0.8, "Medium": 0.5, "Hard": 0.3}
+
+ENDPOINTS = ('/api/init', '/api/question', '/api/check')
+
+ANSWERS = {q["id"]: q["answer"] for questions in question_bank.values() for q in questions}
+
+
+class Learner(threading.Thread):
+    """Simulated learner issuing requests until the deadline"""
+
+    def __init__(self, port, deadline, seed):
+        super().__init__(daemon=True)
+        self.port = port
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.errors = 0
+
+    def request(self, conn, method, path, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        self.latencies[path].append(time.perf_counter() - start)
+        if response.status != 200:
+            self.errors += 1
+            return None
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data)
+
+    def run(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            self.request(conn, 'GET', '/api/init')
+            while time.perf_counter() < self.deadline:
+                question = self.request(conn, 'GET', '/api/question')
+                if question is None:
+                    continue
+                if self.rng.random() < CORRECT_PROBS[question["difficulty"]]:
+                    answer = ANSWERS[question["id"]]
+                else:
+                    answer = "pass  # not a fix"
+                self.request(conn, 'POST', '/api/check', {"answer": answer})
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+        finally:
+            conn.close()
+
+
+def wait_until_ready(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def run_config(workers, threads, args):
+    """Start a server with the given configuration and drive it with learners"""
+    env = dict(os.environ, STUB_GRADER_LATENCY_MS=str(args.stub_latency_ms), ENVIRONMENT='benchmark')
+    env.pop('API_KEY', None)
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py',
+        '--workers', str(workers), '--threads', str(threads),
+        '--bind', f'127.0.0.1:{args.port}', '--access-logfile', '/dev/null',
+        'benchmarks.stub_server:app',
+    ]
+    server = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_until_ready(args.port):
+            raise RuntimeError(f"Server with {workers} workers x {threads} threads did not start")
+
+        start = time.perf_counter()
+        learners = [Learner(args.port, start + args.duration, args.seed + i) for i in range(args.learners)]
+        for learner in learners:
+            learner.start()
+        for learner in learners:
+            learner.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    result = {'workers': workers, 'threads': threads, 'endpoints': {}}
+    total = 0
+    for endpoint in ENDPOINTS:
+        samples = np.array([t for learner in learners for t in learner.latencies[endpoint]])
+        total += len(samples)
+        if len(samples) == 0:
+            continue
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+        result['endpoints'][endpoint] = {
+            'requests': int(len(samples)),
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+        }
+    result['throughput_rps'] = round(total / elapsed, 1)
+    result['errors'] = sum(learner.errors for learner in learners)
+    return result
+
+
+def print_report(results):
+    print(f"\n{'config':>8} {'endpoint':>14} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        config = f"{result['workers']}x{result['threads']}"
+        for endpoint, stats in result['endpoints'].items():
+            print(f"{config:>8} {endpoint:>14} {stats['requests']:>9} "
+                  f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}")
+        print(f"{config:>8} {'throughput':>14} {result['throughput_rps']:>9} req/s, {result['errors']} errors")
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages for throughput drops or p95 increases beyond the tolerance"""
+    regressions = []
+    previous = {(r['workers'], r['threads']): r for r in baseline}
+    for result in results:
+        key = (result['workers'], result['threads'])
+        if key not in previous:
+            continue
+        old = previous[key]
+        config = f"{key[0]}x{key[1]}"
+        if result['throughput_rps'] < old['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{config} throughput {old['throughput_rps']} -> {result['throughput_rps']} req/s")
+        for endpoint, stats in result['endpoints'].items():
+            old_stats = old['endpoints'].get(endpoint)
+            if stats['requests'] < MIN_COMPARE_SAMPLES:
+                continue
+            if old_stats and stats['p95_ms'] > old_stats['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{config} {endpoint} p95 {old_stats['p95_ms']} -> {stats['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /api/* endpoints")
+    parser.add_argument('--configs', default='1x1,2x2', help='Comma-separated WORKERSxTHREADS configurations')
+    parser.add_argument('--learners', type=int, default=8, help='Concurrent simulated learners')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per configuration')
+    parser.add_argument('--stub-latency-ms', type=float, default=50.0, help='Latency of the stubbed grader')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against results stored with --output')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression')
+    args = parser.parse_args()
+
+    results = []
+    for config in args.configs.split(','):
+        workers, threads = (int(n) for n in config.lower().split('x'))
+        results.append(run_config(workers, threads, args))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
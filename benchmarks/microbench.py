@@ -0,0 +1,301 @@
+"""
+Microbenchmarks for grading and adaptation primitives.
+
+Covers normalize_code, traditional_check (realistic and adversarial inputs),
+the local tiers of the grading cascade,
+UCBDifficultyAgent.select_difficulty/update, item selection over a 100k
+question tier, LinUCB scoring and rank-one updates, review heap operations,
+format_question and DebugQuestionSystem construction. Each case reports the
+best per-call time over several repeats; results can be stored as a baseline
+and later runs compared against it.
+
+Usage:
+  python benchmarks/microbench.py                     # run and print
+  python benchmarks/microbench.py --save              # store as baseline
+  python benchmarks/microbench.py --compare           # compare with baseline
+  python benchmarks/microbench.py -k traditional      # only matching cases
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+with open(os.devnull, 'w') as _devnull, contextlib.redirect_stdout(_devnull):
+    import app  # noqa: E402
+from backend_ucb_model import UCBDifficultyAgent  # noqa: E402
+from item_selection import make_item_selector  # noqa: E402
+from difficulty_policies import make_policy  # noqa: E402
+from review_scheduler import ReviewQueue  # noqa: E402
+from grading import GradingCascade  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'microbench.json')
+
+# Registered benchmark cases: name -> zero-argument callable
+CASES = {}
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+def _question(question_id):
+    return app.question_catalog.questions[app.question_catalog.index[question_id]]
+
+
+def _system_with(question_id):
+    system = app.DebugQuestionSystem()
+    system.current_question = _question(question_id)
+    return system
+
+
+# Inputs
+_SHORT_ANSWER = _question("syntax_easy1").answer
+_LONG_ANSWER = max((q.answer for q in app.question_catalog.questions), key=len)
+_ANSI_ANSWER = "\x1b[31m" + "\n\x1b[0m".join(_LONG_ANSWER.split('\n')) * 20
+_HUGE_ANSWER = "\n".join(f"    value_{i} = compute({i})  " for i in range(5000))
+_NEAR_MISS = "\n".join([_LONG_ANSWER.split('\n')[0]] * 2000)
+
+
+@case('normalize_code/short')
+def _():
+    return lambda: app.normalize_code(_SHORT_ANSWER)
+
+
+@case('normalize_code/long')
+def _():
+    return lambda: app.normalize_code(_LONG_ANSWER)
+
+
+@case('normalize_code/ansi_heavy')
+def _():
+    return lambda: app.normalize_code(_ANSI_ANSWER)
+
+
+@case('normalize_code/5k_lines')
+def _():
+    return lambda: app.normalize_code(_HUGE_ANSWER)
+
+
+@case('traditional_check/exact')
+def _():
+    system = _system_with("syntax_easy1")
+    return lambda: system.traditional_check(_SHORT_ANSWER)
+
+
+@case('traditional_check/wrong')
+def _():
+    system = _system_with("syntax_easy1")
+    return lambda: system.traditional_check("def calculate(x, y)\n    return x + y")
+
+
+@case('traditional_check/5k_line_answer')
+def _():
+    system = _system_with("syntax_easy1")
+    return lambda: system.traditional_check(_HUGE_ANSWER)
+
+
+@case('traditional_check/repeated_prefix')
+def _():
+    # Worst case for the sequence scan: the first reference line repeats everywhere
+    question = max(app.question_catalog.questions, key=lambda q: len(q.answer))
+    system = app.DebugQuestionSystem()
+    system.current_question = question
+    return lambda: system.traditional_check(_NEAR_MISS)
+
+
+def _cascade_case(question_id, answer):
+    cascade = GradingCascade()
+    question = _question(question_id)
+    return lambda: cascade.grade(question, answer, fallback=lambda: False)
+
+
+@case('grading/exact')
+def _():
+    return _cascade_case("syntax_easy1", _SHORT_ANSWER)
+
+
+@case('grading/ast')
+def _():
+    return _cascade_case("syntax_easy1", "def calculate( x,y ) :")
+
+
+@case('grading/unchanged')
+def _():
+    return _cascade_case("syntax_easy1", "def calculate(x, y)  # This line has a problem")
+
+
+@case('grading/5k_line_answer')
+def _():
+    return _cascade_case("syntax_easy1", _HUGE_ANSWER)
+
+
+@case('agent/select_difficulty')
+def _():
+    agent = UCBDifficultyAgent()
+    for i in range(300):
+        agent.update(i % 3, float(i % 2))
+    agent.consecutive_correct_count = 0
+    return agent.select_difficulty
+
+
+@case('agent/update')
+def _():
+    agent = UCBDifficultyAgent()
+    return lambda: agent.update(1, 1.0)
+
+
+def _large_item_selector(name, n_questions=100000):
+    selector = make_item_selector(name, n_questions, seed=0)
+    rng = random.Random(0)
+    for _ in range(n_questions):
+        selector.update(rng.randrange(n_questions), rng.random() < 0.6)
+    return selector, np.arange(n_questions, dtype=np.int32)
+
+
+@case('item_selection/target_100k')
+def _():
+    selector, candidates = _large_item_selector('target')
+    return lambda: selector.select(candidates)
+
+
+@case('item_selection/thompson_100k')
+def _():
+    selector, candidates = _large_item_selector('thompson')
+    return lambda: selector.select(candidates)
+
+
+@case('item_selection/update')
+def _():
+    selector = make_item_selector('target', 100000)
+    return lambda: selector.update(12345, True)
+
+
+@case('linucb/select_10k')
+def _():
+    policy = make_policy('linucb', capacity=10000)
+    slots = np.arange(10000)
+    policy.update(slots, (slots % 3).astype(np.int8), slots % 2 == 0, hint_levels=slots % 4)
+    return lambda: policy.select(slots)
+
+
+@case('linucb/update_one')
+def _():
+    policy = make_policy('linucb')
+    slot = policy.allocate()
+    return lambda: policy.update_one(slot, 1, True, hint_levels=1)
+
+
+@case('review/push_pop_10k')
+def _():
+    queue = ReviewQueue()
+    rng = random.Random(0)
+    for i in range(10000):
+        queue.push(rng.randrange(100000), rng.randrange(5), i)
+
+    def push_pop():
+        due, level, question_index = queue.pop()
+        queue.push(due + 100000, level, question_index)
+    return push_pop
+
+
+@case('format_question')
+def _():
+    system = app.DebugQuestionSystem()
+    question = _question("syntax_easy1")
+    return lambda: system.format_question(question)
+
+
+@case('DebugQuestionSystem/construct')
+def _():
+    # Sessions release their difficulty policy slot so the policy arrays stay small
+    return lambda: app.DebugQuestionSystem().close()
+
+
+@case('DebugQuestionSystem/get_next_question')
+def _():
+    system = app.DebugQuestionSystem()
+    return system.get_next_question
+
+
+def run_case(func, repeat):
+    """Best seconds per call over several autoranged repeats"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(selected, repeat):
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        for name in selected:
+            func = CASES[name]()
+            # Silence the debug prints of the code under test
+            with contextlib.redirect_stdout(devnull):
+                results[name] = run_case(func, repeat)
+            print(f"{name:<42} {results[name] * 1e6:>12.2f} us")
+    return results
+
+
+def report(results, baseline, threshold):
+    """Print a comparison table; returns the names of regressed cases"""
+    regressed = []
+    print(f"\n{'case':<42} {'baseline us':>12} {'current us':>12} {'ratio':>7}")
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            print(f"{name:<42} {'-':>12} {current * 1e6:>12.2f} {'new':>7}")
+            continue
+        ratio = current / previous
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  SLOWER'
+            regressed.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"{name:<42} {previous * 1e6:>12.2f} {current * 1e6:>12.2f} {ratio:>7.2f}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for grading and adaptation primitives")
+    parser.add_argument('-k', dest='keyword', help='Only run cases whose name contains this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline file')
+    parser.add_argument('--save', action='store_true', help='Store the results as the baseline')
+    parser.add_argument('--compare', action='store_true', help='Compare the results with the baseline')
+    parser.add_argument('--threshold', type=float, default=0.15, help='Relative change reported as a regression')
+    args = parser.parse_args()
+
+    selected = [name for name in CASES if not args.keyword or args.keyword in name]
+    results = run(selected, args.repeat)
+
+    if args.compare:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressed = report(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} case(s) slower than baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      f, indent=4)
+        print(f"\nBaseline saved to {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""
+WSGI entry point for load tests: the real app with Gemini replaced by a stub grader.
+
+The stub sleeps for STUB_GRADER_LATENCY_MS (default 50) to stand in for the
+upstream call, then grades by comparing normalized lines with the reference
+answer. Run with: gunicorn -c gunicorn_config.py benchmarks.stub_server:app
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+STUB_GRADER_LATENCY_MS = float(os.environ.get('STUB_GRADER_LATENCY_MS', '50'))
+
+
+def stub_check_answer(user_answer, correct_answer, question_text):
+    """Stand-in for gemini_check_answer with a fixed upstream latency"""
+    time.sleep(STUB_GRADER_LATENCY_MS / 1000.0)
+    return app_module.normalize_code(user_answer) == app_module.normalize_code(correct_answer)
+
+
+app_module.gemini_check_answer = stub_check_answer
+app_module.GEMINI_AVAILABLE = True
+app = app_module.app
@@ -0,0 +1,207 @@
+"""
+Online and offline calibration of question difficulty (Elo / 1PL IRT).
+
+Every question gets a difficulty b and every learner an ability theta on a
+logit scale. The modelled chance of a correct answer is
+sigmoid(theta - b), the same model as simulation.py's 'logistic' profile.
+Questions start at the difficulty implied by their bucket in question_bank,
+so an uncalibrated catalog behaves like the static buckets.
+
+  - Online: EloCalibration.update adjusts the question's difficulty and the
+    learner's ability after each first attempt. Step sizes shrink as
+    attempts accumulate.
+  - Offline: fit() runs a regularized joint maximum-likelihood fit over
+    attempt logs, with vectorized Newton steps that alternate between
+    abilities and difficulties.
+
+misbucketed() flags questions whose calibrated difficulty falls in another
+bucket's range.
+
+Usage:
+  python calibration.py ATTEMPT_LOG_DIR [--output calibration.json] [--min-attempts 20]
+"""
+import argparse
+import json
+import threading
+
+import numpy as np
+
+from backend_ucb_model import QuestionCatalog
+from python_question_bank import question_bank
+from result_store import SOURCE_ADAPTIVE, SOURCE_PLACEMENT, iter_spilled_chunks
+from simulation import DEFAULT_CORRECT_PROBS
+
+DIFFICULTY_NAMES = ['Easy', 'Medium', 'Hard']
+
+# Attempts the offline fit learns from; reviews are repeat exposures to a question the learner has seen
+FIT_SOURCES = (SOURCE_ADAPTIVE, SOURCE_PLACEMENT)
+
+# Initial difficulty per bucket: a learner of ability 0 answers with the default probabilities
+TIER_DIFFICULTY = -np.log(DEFAULT_CORRECT_PROBS / (1 - DEFAULT_CORRECT_PROBS))
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class EloCalibration:
+    """Per-question difficulty over a QuestionCatalog, updated Elo-style"""
+
+    def __init__(self, catalog, k_question=0.4, k_learner=0.6, k_decay=0.05):
+        self.catalog = catalog
+        self.k_question = k_question
+        self.k_learner = k_learner
+        self.k_decay = k_decay
+        self.prior = TIER_DIFFICULTY[np.asarray(catalog.difficulties, dtype=np.intp)]
+        self.difficulty = self.prior.copy()
+        self.attempts = np.zeros(len(catalog), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def expected(self, ability, indices=None):
+        """Modelled success probability of a learner for every question (or the given indices)"""
+        difficulty = self.difficulty if indices is None else self.difficulty[indices]
+        return _sigmoid(ability - difficulty)
+
+    def update(self, question_index, ability, learner_attempts, correct):
+        """Record one answer; returns the learner's updated ability"""
+        with self._lock:
+            surprise = float(correct) - _sigmoid(ability - self.difficulty[question_index])
+            self.difficulty[question_index] -= self.k_question / (1 + self.k_decay * self.attempts[question_index]) * surprise
+            self.attempts[question_index] += 1
+        return float(ability + self.k_learner / (1 + self.k_decay * learner_attempts) * surprise)
+
+    def update_batch(self, question_indices, abilities, learner_attempts, correct):
+        """Vectorized update for one answer per learner; returns the updated abilities.
+
+        A question answered several times in the batch takes one damped Newton
+        step over those answers. For a single answer this is close to the
+        sequential Elo step, and it stays stable when a question gets many
+        answers at once.
+        """
+        question_indices = np.asarray(question_indices, dtype=np.intp)
+        n_questions = len(self.difficulty)
+        with self._lock:
+            p = _sigmoid(abilities - self.difficulty[question_indices])
+            surprise = np.asarray(correct, dtype=np.float64) - p
+            k = self.k_question / (1 + self.k_decay * self.attempts)
+            information = np.bincount(question_indices, p * (1 - p), n_questions)
+            self.difficulty -= np.bincount(question_indices, surprise, n_questions) / (information + 1 / k)
+            self.attempts += np.bincount(question_indices, minlength=n_questions)
+        return abilities + self.k_learner / (1 + self.k_decay * np.asarray(learner_attempts)) * surprise
+
+    def suggested_bucket(self):
+        """Bucket whose difficulty range contains each question's calibrated difficulty"""
+        boundaries = (TIER_DIFFICULTY[:-1] + TIER_DIFFICULTY[1:]) / 2
+        return np.searchsorted(boundaries, self.difficulty)
+
+    def misbucketed(self, min_attempts=20):
+        """Questions with enough attempts whose calibrated difficulty belongs to another bucket"""
+        suggested = self.suggested_bucket()
+        flagged = np.flatnonzero((suggested != self.catalog.difficulties) & (self.attempts >= min_attempts))
+        return [{
+            "id": self.catalog.ids[i],
+            "bucket": DIFFICULTY_NAMES[self.catalog.difficulties[i]],
+            "suggested_bucket": DIFFICULTY_NAMES[suggested[i]],
+            "difficulty": round(float(self.difficulty[i]), 3),
+            "attempts": int(self.attempts[i])
+        } for i in flagged]
+
+    def save(self, path):
+        """Write calibrated difficulties keyed by question id"""
+        with open(path, 'w') as f:
+            json.dump({
+                self.catalog.ids[i]: {"difficulty": float(self.difficulty[i]), "attempts": int(self.attempts[i])}
+                for i in range(len(self.catalog))
+            }, f, indent=4)
+
+    def load(self, path):
+        """Read difficulties written by save(); questions missing from the file keep their bucket prior"""
+        with open(path, 'r') as f:
+            saved = json.load(f)
+        for question_id, entry in saved.items():
+            index = self.catalog.index.get(question_id)
+            if index is not None:
+                self.difficulty[index] = entry["difficulty"]
+                self.attempts[index] = entry["attempts"]
+
+
+def _load_events(chunks, catalog, first_attempts_only):
+    """Concatenate the columns needed for fitting from attempt-log chunks.
+
+    Logged question keys are mapped to the catalog's current indices; answers to
+    questions that have since left the bank are dropped, and so are reviews.
+    """
+    sessions, questions, correct = [], [], []
+    for chunk in chunks:
+        indices = catalog.indices_for_keys(chunk['question_key'])
+        keep = (indices >= 0) & np.isin(chunk['source'], FIT_SOURCES)
+        if first_attempts_only:
+            keep &= np.asarray(chunk['first_attempt'])
+        sessions.append(np.asarray(chunk['session_id'])[keep])
+        questions.append(indices[keep])
+        correct.append(np.asarray(chunk['is_correct'], dtype=np.float64)[keep])
+    if not sessions:
+        return np.empty(0, np.uint64), np.empty(0, np.intp), np.empty(0)
+    return np.concatenate(sessions), np.concatenate(questions), np.concatenate(correct)
+
+
+def fit(chunks, catalog, n_iter=50, question_reg=1.0, ability_reg=1.0, tol=1e-4, first_attempts_only=True):
+    """Fit difficulties (and per-session abilities) to attempt-log chunks.
+
+    Maximizes the 1PL log-likelihood with Gaussian priors (difficulties around
+    their bucket prior, abilities around 0) by alternating diagonal Newton
+    steps. Returns the fitted EloCalibration and the abilities per session id.
+    """
+    sessions, questions, correct = _load_events(chunks, catalog, first_attempts_only)
+    calibration = EloCalibration(catalog)
+    session_ids, learner = np.unique(sessions, return_inverse=True)
+    n_questions = len(catalog)
+    b = calibration.prior.copy()
+    theta = np.zeros(len(session_ids))
+
+    for iteration in range(n_iter):
+        p = _sigmoid(theta[learner] - b[questions])
+        theta_step = ((np.bincount(learner, correct - p, len(theta)) - ability_reg * theta)
+                      / (np.bincount(learner, p * (1 - p), len(theta)) + ability_reg))
+        theta += theta_step
+
+        p = _sigmoid(theta[learner] - b[questions])
+        b_step = ((np.bincount(questions, p - correct, n_questions) - question_reg * (b - calibration.prior))
+                  / (np.bincount(questions, p * (1 - p), n_questions) + question_reg))
+        b += b_step
+
+        if max(np.abs(theta_step).max(initial=0), np.abs(b_step).max(initial=0)) < tol:
+            break
+
+    calibration.difficulty = b
+    calibration.attempts = np.bincount(questions, minlength=n_questions).astype(np.int64)
+    return calibration, dict(zip(session_ids.tolist(), theta.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate question difficulty from attempt logs")
+    parser.add_argument('log_dir', help='Directory with attempts_*.npy chunks (ATTEMPT_LOG_DIR)')
+    parser.add_argument('--output', default=None, help='Write calibrated difficulties to this JSON file')
+    parser.add_argument('--min-attempts', type=int, default=20, help='Attempts needed before flagging a question')
+    parser.add_argument('--all-attempts', action='store_true', help='Also fit retries after wrong answers')
+    args = parser.parse_args()
+
+    catalog = QuestionCatalog(question_bank)
+    calibration, abilities = fit(iter_spilled_chunks(args.log_dir), catalog,
+                                 first_attempts_only=not args.all_attempts)
+    print(f"Fitted {len(catalog)} questions and {len(abilities)} sessions "
+          f"from {int(calibration.attempts.sum())} attempts")
+
+    flagged = calibration.misbucketed(args.min_attempts)
+    for entry in flagged:
+        print(f"  {entry['id']}: {entry['bucket']} -> {entry['suggested_bucket']} "
+              f"(difficulty {entry['difficulty']:+.2f}, {entry['attempts']} attempts)")
+    print(f"{len(flagged)} questions flagged as misbucketed")
+
+    if args.output:
+        calibration.save(args.output)
+        print(f"Calibration written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Cohort-level priors for warm-starting new learners.
+
+Every answer and every session's settled difficulty (its level after
+SETTLE_AFTER first attempts) is counted per cohort. Each worker buffers its
+counts and a background thread merges them into COHORT_PRIORS_FILE under an
+fcntl lock every SYNC_INTERVAL seconds, then reads back the totals of all
+workers. Without the file the priors are kept per process.
+
+A new session in a cohort with enough settled sessions starts at the
+cohort's median settled difficulty. Its difficulty policy and UCB agent are
+seeded with pseudo-counts from the cohort's success rates instead of zeros.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COHORT_PRIORS_FILE = os.environ.get('COHORT_PRIORS_FILE')
+SYNC_INTERVAL = float(os.environ.get('COHORT_SYNC_INTERVAL', '5'))
+SETTLE_AFTER = 6  # First attempts after which a session's difficulty counts as its settled level
+MAX_COHORTS = 1000
+DEFAULT_COHORT = 'default'
+_COHORT_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+_FIELDS = ('attempts', 'correct', 'settled')
+
+
+def _write_json(path, data):
+    """Atomically replace a JSON file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class CohortPriors:
+    """Per-cohort answer and settled-difficulty counts, shared across workers through a file"""
+
+    def __init__(self, path=COHORT_PRIORS_FILE, n_difficulties=3, sync_interval=SYNC_INTERVAL,
+                 prior_strength=4.0, min_sessions=20, settle_after=SETTLE_AFTER):
+        self.path = path
+        self.n_difficulties = n_difficulties
+        self.sync_interval = sync_interval
+        self.prior_strength = prior_strength
+        self.min_sessions = min_sessions
+        self.settle_after = settle_after
+        self._totals = {}  # cohort -> field -> counts per difficulty, as of the last sync
+        self._pending = {}  # Local counts not yet merged into the shared file
+        self._starts = {}  # cohort -> starting difficulty (or None), until the settled counts change
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._syncer_pid = None
+
+    def cohort_name(self, name):
+        """Validated cohort name (DEFAULT_COHORT for missing or malformed names)"""
+        return name if name and _COHORT_NAME.match(name) else DEFAULT_COHORT
+
+    def _empty(self):
+        return {field: np.zeros(self.n_difficulties, dtype=np.int64) for field in _FIELDS}
+
+    def _add(self, cohort, field, difficulty, amount=1):
+        with self._lock:
+            if cohort not in self._pending:
+                self._pending[cohort] = self._empty()
+            self._pending[cohort][field][difficulty] += amount
+            if field == 'settled':
+                self._starts.pop(cohort, None)
+
+    def record_answer(self, cohort, difficulty, correct):
+        self._add(cohort, 'attempts', difficulty)
+        if correct:
+            self._add(cohort, 'correct', difficulty)
+
+    def record_settled(self, cohort, difficulty):
+        self._add(cohort, 'settled', difficulty)
+
+    def stats(self, cohort):
+        """Synced totals plus local pending counts for a cohort"""
+        with self._lock:
+            view = self._empty()
+            for source in (self._totals, self._pending):
+                for field, counts in source.get(cohort, {}).items():
+                    view[field] += counts
+            return view
+
+    def sync(self, force=False):
+        """Merge pending counts into the shared file and reload every worker's totals (throttled)"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = now
+            pending, self._pending = self._pending, {}
+
+        if not self.path:
+            with self._lock:
+                for cohort, fields in pending.items():
+                    totals = self._totals.setdefault(cohort, self._empty())
+                    for field, counts in fields.items():
+                        totals[field] += counts
+                self._starts.clear()
+            return
+
+        try:
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    data = _read_json(self.path) or {}
+                    for cohort, fields in pending.items():
+                        if cohort not in data and len(data) >= MAX_COHORTS:
+                            cohort = DEFAULT_COHORT
+                        stored = data.setdefault(cohort, {field: [0] * self.n_difficulties for field in _FIELDS})
+                        for field, counts in fields.items():
+                            stored[field] = (np.asarray(stored[field], dtype=np.int64) + counts).tolist()
+                    if pending:
+                        _write_json(self.path, data)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"Cohort priors sync failed: {e}")
+            with self._lock:
+                for cohort, fields in pending.items():
+                    for field, counts in fields.items():
+                        self._pending.setdefault(cohort, self._empty())[field] += counts
+            return
+
+        totals = {cohort: {field: np.asarray(fields[field], dtype=np.int64) for field in _FIELDS}
+                  for cohort, fields in data.items()}
+        with self._lock:
+            self._totals = totals
+            self._starts.clear()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(max(self.sync_interval, 0.1))
+            self.sync()
+
+    def start_sync(self):
+        """Make sure this worker's background sync is running"""
+        if self._syncer_pid != os.getpid():
+            with self._lock:
+                # Threads do not survive fork, so each worker starts its own
+                if self._syncer_pid != os.getpid():
+                    self._syncer_pid = os.getpid()
+                    threading.Thread(target=self._sync_loop, name='cohort-priors-sync', daemon=True).start()
+
+    def starting_difficulty(self, cohort):
+        """Median settled difficulty of the cohort, or None while it has too few settled sessions"""
+        with self._lock:
+            if cohort not in self._starts:
+                settled = sum((source[cohort]['settled'] for source in (self._totals, self._pending)
+                               if cohort in source), np.zeros(self.n_difficulties, dtype=np.int64))
+                start = None
+                if settled.sum() >= self.min_sessions:
+                    start = int(np.searchsorted(np.cumsum(settled), settled.sum() / 2))
+                if len(self._starts) >= MAX_COHORTS:
+                    self._starts.clear()
+                self._starts[cohort] = start
+            return self._starts[cohort]
+
+    def pseudo_counts(self, cohort):
+        """(attempts, successes) per difficulty: the cohort's smoothed success rates at prior_strength weight"""
+        stats = self.stats(cohort)
+        rates = (stats['correct'] + 1.0) / (stats['attempts'] + 2.0)
+        attempts = np.minimum(stats['attempts'], self.prior_strength).astype(np.float64)
+        return attempts, rates * attempts
@@ -0,0 +1,484 @@
+"""
+Pluggable difficulty-selection policies with array-backed state.
+
+Every policy keeps the state of many learners in NumPy arrays indexed by a
+dense slot, and selects or updates any set of slots with vectorized
+operations. The same implementations serve a single learner in the API (one
+slot per DebugQuestionSystem), millions of learners in simulation.py, and
+the sessions of a log in replay.py.
+
+Policies:
+  rules           DebugQuestionSystem's rule set: move up after `up_after`
+                  consecutive correct answers, down after `down_after`
+                  consecutive wrong answers
+  agent           UCBDifficultyAgent's rule set: forced up/down moves, else UCB1
+  ucb1            plain UCB1
+  sw_ucb          sliding-window UCB over each learner's last `window` answers
+  discounted_ucb  UCB with counts discounted by `gamma` on every answer
+  thompson        Beta-Bernoulli Thompson sampling
+  linucb          LinUCB with one linear model per difficulty over learner
+                  features (recent accuracy, hint usage, attempt count, last
+                  difficulty)
+
+The policy used by the API is chosen per deployment with the
+DIFFICULTY_POLICY and DIFFICULTY_POLICY_PARAMS (JSON) environment variables.
+"""
+import threading
+
+import numpy as np
+
+N_DIFFICULTIES = 3
+
+
+class DifficultyPolicy:
+    """Base class: per-slot state arrays plus vectorized select/update"""
+
+    name = None
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024):
+        self.n_difficulties = n_difficulties
+        self.capacity = 0
+        self.state = {}
+        self.lock = threading.Lock()
+        self._free_slots = []
+        self._next_slot = 0
+        self.resize(capacity)
+
+    def state_spec(self):
+        """Field name -> (dtype, per-slot shape, initial value)"""
+        return {}
+
+    def resize(self, capacity):
+        """Grow every state array to hold at least capacity slots"""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, 2 * self.capacity)
+        for name, (dtype, shape, fill) in self.state_spec().items():
+            grown = np.full((capacity,) + shape, fill, dtype=dtype)
+            if name in self.state:
+                grown[:self.capacity] = self.state[name]
+            self.state[name] = grown
+        self.capacity = capacity
+
+    def reset_slots(self, slots):
+        """Return slots to their initial state"""
+        for name, (dtype, shape, fill) in self.state_spec().items():
+            self.state[name][slots] = fill
+
+    def allocate(self):
+        """Reserve a slot for a new learner"""
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = self._next_slot
+        self._next_slot += 1
+        self.resize(self._next_slot)
+        return slot
+
+    def release(self, slot):
+        """Free a learner's slot for reuse"""
+        self.reset_slots(slot)
+        self._free_slots.append(slot)
+
+    # Whether warm_start may seed the counts/rewards arrays (not for windowed statistics)
+    warm_start_counts = True
+
+    def set_difficulty(self, slots, difficulty):
+        """Move slots to a difficulty (e.g. after a placement test), keeping their statistics"""
+        for name in ('current', 'last_difficulty'):
+            if name in self.state:
+                self.state[name][slots] = difficulty
+
+    def warm_start(self, slots, difficulty, attempts, successes):
+        """Seed slots with a starting difficulty and pseudo-counts per difficulty (e.g. cohort priors)"""
+        self.set_difficulty(slots, difficulty)
+        state = self.state
+        if self.warm_start_counts and 'counts' in state:
+            dtype = state['counts'].dtype
+            counts = np.rint(attempts) if dtype.kind == 'i' else attempts
+            state['counts'][slots] = counts
+            state['rewards'][slots] = np.rint(successes) if dtype.kind == 'i' else successes
+            if 'total_count' in state:
+                state['total_count'][slots] = counts.sum()
+        if 'successes' in state:
+            state['successes'][slots] = successes
+            state['failures'][slots] = attempts - successes
+
+    def initial_difficulty(self):
+        """What select() returns for a fresh slot, as a plain int (None when it depends on shared state or randomness)"""
+        return None
+
+    def select(self, slots):
+        """Difficulty to serve next for each slot"""
+        raise NotImplementedError
+
+    def update(self, slots, difficulties, correct, **context):
+        """Record one answer per slot (slots must be unique within a call).
+
+        context holds optional per-answer arrays such as hint_levels; policies
+        that do not use them ignore them.
+        """
+        raise NotImplementedError
+
+    def select_one(self, slot):
+        return int(self.select(np.array([slot]))[0])
+
+    def update_one(self, slot, difficulty, correct, **context):
+        self.update(np.array([slot]), np.array([difficulty], dtype=np.int8), np.array([bool(correct)]),
+                    **{name: np.array([value]) for name, value in context.items()})
+
+
+def _per_slot(value, slots):
+    """Broadcast a scalar parameter, or index a per-slot parameter array, as a column"""
+    value = np.asarray(value, dtype=np.float64)
+    return value[slots][:, None] if value.ndim == 1 else value
+
+
+def _ucb_choice(counts, values, log_total, exploration_param):
+    """argmax of mean + exploration bonus, trying unplayed difficulties first"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ucb = values + exploration_param * np.sqrt(log_total[:, None] / counts)
+    return np.argmax(np.where(counts == 0, np.inf, ucb), axis=1)
+
+
+class StreakRulesPolicy(DifficultyPolicy):
+    """Move up after up_after consecutive correct answers, down after down_after consecutive wrong ones"""
+
+    name = 'rules'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, up_after=2, down_after=1, start=0):
+        self.up_after = up_after
+        self.down_after = down_after
+        self.start = start
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'current': (np.int8, (), self.start),
+            'consecutive_correct': (np.int16, (), 0),
+            'consecutive_wrong': (np.int16, (), 0),
+        }
+
+    def initial_difficulty(self):
+        return int(self.start)
+
+    def select(self, slots):
+        return self.state['current'][slots]
+
+    def update(self, slots, difficulties, correct, **context):
+        state = self.state
+        current = state['current'][slots].astype(np.int16)
+        right = np.where(correct, state['consecutive_correct'][slots] + 1, 0)
+        wrong = np.where(correct, 0, state['consecutive_wrong'][slots] + 1)
+
+        upgrade = (right >= self.up_after) & (current < self.n_difficulties - 1)
+        downgrade = (wrong >= self.down_after) & (current > 0)
+        current = current + upgrade - downgrade
+        right = np.where(upgrade, 0, right)
+        # The wrong streak restarts at the new, easier level
+        wrong = np.where(downgrade, 0, wrong)
+
+        state['current'][slots] = current
+        state['consecutive_correct'][slots] = right
+        state['consecutive_wrong'][slots] = wrong
+
+
+class UCB1Policy(DifficultyPolicy):
+    """Plain UCB1 over difficulties, with reward = correctness"""
+
+    name = 'ucb1'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, exploration_param=np.sqrt(2)):
+        self.exploration_param = exploration_param
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'counts': (np.int32, (self.n_difficulties,), 0),
+            'rewards': (np.int32, (self.n_difficulties,), 0),
+            'total_count': (np.int32, (), 0),
+        }
+
+    def initial_difficulty(self):
+        return 0  # Unplayed difficulties are tried first, in order
+
+    def _ucb_select(self, slots):
+        state = self.state
+        counts = state['counts'][slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = state['rewards'][slots] / counts
+        log_total = np.log(np.maximum(state['total_count'][slots], 1))
+        return _ucb_choice(counts, values, log_total, _per_slot(self.exploration_param, slots))
+
+    def select(self, slots):
+        return self._ucb_select(slots).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, **context):
+        state = self.state
+        state['counts'][slots, difficulties] += 1
+        state['rewards'][slots, difficulties] += correct
+        state['total_count'][slots] += 1
+
+
+class AgentRulesPolicy(UCB1Policy):
+    """UCBDifficultyAgent's rules: forced upgrade/downgrade on streaks, UCB1 otherwise"""
+
+    name = 'agent'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, exploration_param=np.sqrt(2),
+                 up_after=2, down_after=3):
+        self.up_after = up_after
+        self.down_after = down_after
+        super().__init__(n_difficulties, capacity, exploration_param)
+
+    def state_spec(self):
+        spec = super().state_spec()
+        spec.update({
+            'consecutive_correct': (np.int16, (), 0),
+            'consecutive_wrong': (np.int16, (), 0),
+            'last_difficulty': (np.int8, (), -1),  # -1 = no history yet
+        })
+        return spec
+
+    def select(self, slots):
+        state = self.state
+        last = state['last_difficulty'][slots]
+        has_history = last >= 0
+        current = np.where(has_history, last, 0)
+
+        # Forced upgrade after up_after consecutive correct answers (resets the streak)
+        upgrade = (state['consecutive_correct'][slots] >= self.up_after) & (current < self.n_difficulties - 1)
+        state['consecutive_correct'][slots[upgrade]] = 0
+
+        # Move down after down_after consecutive wrong answers
+        downgrade = ~upgrade & has_history & (state['consecutive_wrong'][slots] >= self.down_after) & (current > 0)
+
+        choice = self._ucb_select(slots)
+        choice = np.where(upgrade, current + 1, choice)
+        return np.where(downgrade, current - 1, choice).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, **context):
+        super().update(slots, difficulties, correct)
+        state = self.state
+        state['consecutive_correct'][slots] = np.where(correct, state['consecutive_correct'][slots] + 1, 0)
+        state['consecutive_wrong'][slots] = np.where(correct, 0, state['consecutive_wrong'][slots] + 1)
+        state['last_difficulty'][slots] = difficulties
+
+
+class SlidingWindowUCBPolicy(DifficultyPolicy):
+    """UCB computed over each learner's last `window` answers only"""
+
+    name = 'sw_ucb'
+    warm_start_counts = False
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, exploration_param=np.sqrt(2), window=20):
+        self.exploration_param = exploration_param
+        self.window = window
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'counts': (np.int16, (self.n_difficulties,), 0),
+            'rewards': (np.int16, (self.n_difficulties,), 0),
+            'total_count': (np.int32, (), 0),
+            'window_difficulty': (np.int8, (self.window,), -1),  # Ring buffer, -1 = empty
+            'window_correct': (np.bool_, (self.window,), False),
+            'window_pos': (np.int16, (), 0),
+        }
+
+    def initial_difficulty(self):
+        return 0  # Unplayed difficulties are tried first, in order
+
+    def select(self, slots):
+        state = self.state
+        counts = state['counts'][slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = state['rewards'][slots] / counts
+        log_window = np.log(np.clip(state['total_count'][slots], 1, self.window))
+        return _ucb_choice(counts, values, log_window, _per_slot(self.exploration_param, slots)).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, **context):
+        state = self.state
+        pos = state['window_pos'][slots]
+
+        # Drop the answer leaving the window
+        old_difficulty = state['window_difficulty'][slots, pos]
+        old_correct = state['window_correct'][slots, pos]
+        full = old_difficulty >= 0
+        state['counts'][slots[full], old_difficulty[full]] -= 1
+        state['rewards'][slots[full], old_difficulty[full]] -= old_correct[full]
+
+        state['window_difficulty'][slots, pos] = difficulties
+        state['window_correct'][slots, pos] = correct
+        state['counts'][slots, difficulties] += 1
+        state['rewards'][slots, difficulties] += correct
+        state['window_pos'][slots] = (pos + 1) % self.window
+        state['total_count'][slots] += 1
+
+
+class DiscountedUCBPolicy(DifficultyPolicy):
+    """UCB with every learner's statistics discounted by gamma per answer"""
+
+    name = 'discounted_ucb'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, exploration_param=np.sqrt(2), gamma=0.95):
+        self.exploration_param = exploration_param
+        self.gamma = gamma
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'counts': (np.float32, (self.n_difficulties,), 0.0),
+            'rewards': (np.float32, (self.n_difficulties,), 0.0),
+        }
+
+    def initial_difficulty(self):
+        return 0  # Unplayed difficulties are tried first, in order
+
+    def select(self, slots):
+        state = self.state
+        counts = state['counts'][slots]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = state['rewards'][slots] / counts
+        log_total = np.log(np.maximum(counts.sum(axis=1), 1.0))
+        return _ucb_choice(counts, values, log_total, _per_slot(self.exploration_param, slots)).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, **context):
+        state = self.state
+        state['counts'][slots] *= self.gamma
+        state['rewards'][slots] *= self.gamma
+        state['counts'][slots, difficulties] += 1.0
+        state['rewards'][slots, difficulties] += correct
+
+
+class ThompsonSamplingPolicy(DifficultyPolicy):
+    """Beta-Bernoulli Thompson sampling over difficulties"""
+
+    name = 'thompson'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, prior_alpha=1.0, prior_beta=1.0, seed=None):
+        self.prior_alpha = prior_alpha
+        self.prior_beta = prior_beta
+        self.rng = np.random.default_rng(seed)
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'successes': (np.float32, (self.n_difficulties,), 0.0),
+            'failures': (np.float32, (self.n_difficulties,), 0.0),
+        }
+
+    def select(self, slots):
+        state = self.state
+        samples = self.rng.beta(self.prior_alpha + state['successes'][slots],
+                                self.prior_beta + state['failures'][slots])
+        return np.argmax(samples, axis=1).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, **context):
+        state = self.state
+        state['successes'][slots, difficulties] += correct
+        state['failures'][slots, difficulties] += ~np.asarray(correct, dtype=bool)
+
+
+class LinUCBPolicy(DifficultyPolicy):
+    """Disjoint LinUCB: per-difficulty ridge regression over learner features, shared by all learners.
+
+    Each difficulty (arm) keeps A^-1 and b. A single answer updates A^-1 with a
+    rank-one Sherman-Morrison step. A large batch accumulates A and inverts it
+    once, since one d x d inverse costs less than thousands of rank-one steps.
+    Scoring builds the feature matrix of every slot and evaluates all arms at
+    once.
+
+    The reward is correctness weighted by difficulty ((difficulty + 1) / D),
+    so the best arm is the hardest level the learner still answers often
+    enough. Use reward='correct' for plain correctness.
+    """
+
+    name = 'linucb'
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES, capacity=1024, exploration_param=1.0, ridge=1.0,
+                 accuracy_decay=0.8, max_hint_level=3, reward='weighted'):
+        self.exploration_param = exploration_param
+        self.accuracy_decay = accuracy_decay
+        self.max_hint_level = max_hint_level
+        self.reward = reward
+        self.n_features = 4 + n_difficulties
+        self.A = np.broadcast_to(ridge * np.eye(self.n_features), (n_difficulties, self.n_features, self.n_features)).copy()
+        self.A_inv = np.linalg.inv(self.A)
+        self.b = np.zeros((n_difficulties, self.n_features))
+        self.theta = np.zeros((n_difficulties, self.n_features))
+        super().__init__(n_difficulties, capacity)
+
+    def state_spec(self):
+        return {
+            'recent_accuracy': (np.float32, (), 0.5),
+            'hint_rate': (np.float32, (), 0.0),
+            'attempts': (np.int32, (), 0),
+            'last_difficulty': (np.int8, (), -1),
+        }
+
+    def features(self, slots):
+        """Feature matrix (len(slots), n_features): bias, accuracy, hint rate, experience, last difficulty one-hot"""
+        state = self.state
+        X = np.zeros((len(slots), self.n_features))
+        X[:, 0] = 1.0
+        X[:, 1] = state['recent_accuracy'][slots]
+        X[:, 2] = state['hint_rate'][slots]
+        X[:, 3] = np.minimum(state['attempts'][slots], 50) / 50
+        last = state['last_difficulty'][slots]
+        seen = np.flatnonzero(last >= 0)
+        X[seen, 4 + last[seen]] = 1.0
+        return X
+
+    def scores(self, slots):
+        """Upper confidence bound per slot and difficulty, shape (len(slots), n_difficulties)"""
+        X = self.features(slots)
+        mean = X @ self.theta.T
+        variance = np.stack([((X @ A_inv) * X).sum(axis=1) for A_inv in self.A_inv], axis=1)
+        return mean + _per_slot(self.exploration_param, slots) * np.sqrt(np.maximum(variance, 0))
+
+    def select(self, slots):
+        return np.argmax(self.scores(slots), axis=1).astype(np.int8)
+
+    def update(self, slots, difficulties, correct, hint_levels=None, **context):
+        X = self.features(slots)
+        correct = np.asarray(correct, dtype=np.float64)
+        rewards = correct * (np.asarray(difficulties) + 1) / self.n_difficulties if self.reward == 'weighted' else correct
+
+        for arm in range(self.n_difficulties):
+            rows = np.flatnonzero(difficulties == arm)
+            if len(rows) == 0:
+                continue
+            X_arm = X[rows]
+            if len(rows) <= self.n_features:
+                for x in X_arm:
+                    # Sherman-Morrison: (A + x x^T)^-1 = A^-1 - (A^-1 x)(A^-1 x)^T / (1 + x^T A^-1 x)
+                    A_inv_x = self.A_inv[arm] @ x
+                    self.A_inv[arm] -= np.outer(A_inv_x, A_inv_x) / (1.0 + x @ A_inv_x)
+                self.A[arm] += X_arm.T @ X_arm
+            else:
+                self.A[arm] += X_arm.T @ X_arm
+                self.A_inv[arm] = np.linalg.inv(self.A[arm])
+            self.b[arm] += X_arm.T @ rewards[rows]
+            self.theta[arm] = self.A_inv[arm] @ self.b[arm]
+
+        state = self.state
+        state['recent_accuracy'][slots] = self.accuracy_decay * state['recent_accuracy'][slots] + (1 - self.accuracy_decay) * correct
+        if hint_levels is not None:
+            used = np.minimum(np.asarray(hint_levels, dtype=np.float32) / self.max_hint_level, 1.0)
+            state['hint_rate'][slots] = self.accuracy_decay * state['hint_rate'][slots] + (1 - self.accuracy_decay) * used
+        state['attempts'][slots] += 1
+        state['last_difficulty'][slots] = difficulties
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (StreakRulesPolicy, AgentRulesPolicy, UCB1Policy, SlidingWindowUCBPolicy,
+                   DiscountedUCBPolicy, ThompsonSamplingPolicy, LinUCBPolicy)
+}
+
+
+def make_policy(name, **params):
+    """Instantiate a registered policy by name"""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown difficulty policy '{name}'. Available: {', '.join(POLICIES)}")
+    return POLICIES[name](**params)
@@ -0,0 +1,203 @@
+"""
+Tiered answer grading: cheap local graders first, the LLM only when they are unsure.
+
+Each tier returns a Verdict (correct, confidence, tier) or None when it has
+no opinion. The first verdict with confidence of at least GRADING_MIN_CONFIDENCE
+is final:
+
+  1. exact      normalized lines equal the reference answer; an empty
+                answer is wrong
+  2. ast        lines are syntactically equivalent to the reference after
+                parsing (spacing, quotes, parentheses and comments ignored)
+  3. unchanged  every line already appears in the question's code, i.e. the
+                bug was resubmitted unfixed
+  4. cache      an earlier LLM verdict for the same normalized answer
+  5. gemini     the LLM call, coalesced through a SingleFlight
+  6. fallback   the traditional line-matching check, when the LLM is
+                unavailable ('traditional') or fails ('gemini_fallback')
+
+Answers that merely contain the reference lines among others get
+CONTAINED_CONFIDENCE, which is below the default threshold, so they go on
+to the LLM.
+
+Only the LLM verdicts are cached, in a per-worker LRU of VERDICT_CACHE_SIZE
+entries keyed by question id and normalized answer.
+"""
+import ast
+import io
+import os
+import re
+import threading
+import tokenize
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import tracing
+from singleflight import make_key
+
+MIN_CONFIDENCE = float(os.environ.get('GRADING_MIN_CONFIDENCE', '0.9'))
+VERDICT_CACHE_SIZE = int(os.environ.get('VERDICT_CACHE_SIZE', '4096'))
+MAX_PARSED_LINES = 200  # Longer answers skip the parsing tiers, which cost a parse per line
+
+EXACT_CONFIDENCE = 1.0
+# Reference lines found in sequence inside a longer answer: the other lines are unchecked,
+# so this stays below MIN_CONFIDENCE and such answers escalate
+CONTAINED_CONFIDENCE = 0.8
+AST_CONFIDENCE = 0.95
+UNCHANGED_CONFIDENCE = 0.95
+LLM_CONFIDENCE = 0.9
+FALLBACK_CONFIDENCE = 0.6
+
+Verdict = namedtuple('Verdict', ('correct', 'confidence', 'tier'))
+
+# Wrappers that make a single block header or clause parse on its own
+_FRAGMENT_WRAPPERS = (
+    ('', ''),
+    ('', '\n    pass'),
+    ('', '\n    pass\nexcept Exception:\n    pass'),
+    ('try:\n    pass\n', '\n    pass'),
+    ('if True:\n    pass\n', '\n    pass'),
+)
+
+
+@tracing.traced('normalize_code')
+def normalize_code(code):
+    """
+    Normalize code by trimming whitespace from each line and keeping only non-empty lines.
+    This allows comparison of code regardless of indentation differences.
+    """
+    # Remove any special characters or color codes
+    code = re.sub(r'\x1b\[[0-9;]*[mGKH]', '', code)
+
+    # Process each line: trim whitespace and keep only non-empty lines
+    lines = []
+    for line in code.split('\n'):
+        trimmed = line.strip()
+        if trimmed:  # Only include non-empty lines
+            lines.append(trimmed)
+
+    return lines  # Return array of trimmed lines
+
+
+@lru_cache(maxsize=8192)
+def strip_comment(line):
+    """Line without its trailing comment (unchanged when it does not tokenize)"""
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(line).readline):
+            if token.type == tokenize.COMMENT:
+                return line[:token.start[1]].rstrip()
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return line
+
+
+@lru_cache(maxsize=8192)
+def canonical_line(line):
+    """AST dump of one (possibly fragmentary) line of code, or None when it does not parse"""
+    for prefix, suffix in _FRAGMENT_WRAPPERS:
+        try:
+            return ast.dump(ast.parse(prefix + line + suffix))
+        except (SyntaxError, ValueError):
+            continue
+    return None
+
+
+def _contains_sequence(lines, sequence):
+    n = len(sequence)
+    return any(lines[i:i + n] == sequence for i in range(len(lines) - n + 1))
+
+
+def _match(user_lines, answer_lines, confidence, tier):
+    if user_lines == answer_lines:
+        return Verdict(True, confidence, tier)
+    if answer_lines and _contains_sequence(user_lines, answer_lines):
+        return Verdict(True, min(confidence, CONTAINED_CONFIDENCE), tier)
+    return None
+
+
+def exact_match(user_lines, answer_lines):
+    if not user_lines:
+        return Verdict(False, EXACT_CONFIDENCE, 'exact')
+    return _match(user_lines, answer_lines, EXACT_CONFIDENCE, 'exact')
+
+
+def ast_match(user_lines, answer_lines):
+    if len(user_lines) > MAX_PARSED_LINES:
+        return None
+    answer_dumps = [canonical_line(line) for line in answer_lines]
+    if None in answer_dumps:
+        return None
+    return _match([canonical_line(line) for line in user_lines], answer_dumps, AST_CONFIDENCE, 'ast')
+
+
+def unchanged_match(user_lines, question_lines):
+    if len(user_lines) > MAX_PARSED_LINES:
+        return None
+    question_code = {strip_comment(line) for line in question_lines}
+    if all(strip_comment(line) in question_code for line in user_lines):
+        return Verdict(False, UNCHANGED_CONFIDENCE, 'unchanged')
+    return None
+
+
+class GradingCascade:
+    """Runs the grading tiers in order and caches LLM verdicts"""
+
+    def __init__(self, flight=None, min_confidence=MIN_CONFIDENCE, cache_size=VERDICT_CACHE_SIZE):
+        self.flight = flight
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (question id, answer digest) -> Verdict
+        self._cache_lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._cache_lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+                return verdict._replace(tier='cache')
+        return None
+
+    def _remember(self, key, verdict):
+        with self._cache_lock:
+            self._cache[key] = verdict
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def local_verdict(self, question, user_lines):
+        """First confident verdict of the local tiers, or None when all are unsure"""
+        answer_lines = normalize_code(question.answer)
+        tiers = (lambda: exact_match(user_lines, answer_lines),
+                 lambda: ast_match(user_lines, answer_lines),
+                 lambda: unchanged_match(user_lines, normalize_code(question.text)))
+        for tier in tiers:
+            verdict = tier()
+            if verdict is not None and verdict.confidence >= self.min_confidence:
+                return verdict
+        return None
+
+    def grade(self, question, user_answer, fallback, llm=None):
+        """
+        Verdict for user_answer. llm(question, user_answer) returns True, False
+        or None on failure; fallback() is the traditional check.
+        """
+        user_lines = normalize_code(user_answer)
+        verdict = self.local_verdict(question, user_lines)
+        if verdict is not None:
+            return verdict
+
+        if llm is None:
+            return Verdict(fallback(), FALLBACK_CONFIDENCE, 'traditional')
+
+        key = make_key(question.id, '\n'.join(user_lines))
+        verdict = self._cached(key)
+        if verdict is not None and verdict.confidence >= self.min_confidence:
+            return verdict
+
+        call = lambda: llm(question, user_answer)  # noqa: E731
+        result = self.flight.do(key, call) if self.flight is not None else call()
+        if result is None:
+            return Verdict(fallback(), FALLBACK_CONFIDENCE, 'gemini_fallback')
+        verdict = Verdict(bool(result), LLM_CONFIDENCE, 'gemini')
+        self._remember(key, verdict)
+        return verdict
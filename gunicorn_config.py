@@ -1,5 +1,8 @@
 """Gunicorn configuration file for optimal performance on Render.com"""
 import os
+import sys
+import shutil
+import tempfile
 import multiprocessing
 
 # Basic settings
@@ -25,3 +28,32 @@ loglevel = "info"
 
 # Handle reloads gracefully
 preload_app = True
+
+# Shared directory where each worker publishes its metrics for /metrics aggregation
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'adaptive_backend_metrics'))
+
+# Cohort statistics merged by all workers (kept across restarts)
+os.environ.setdefault('COHORT_PRIORS_FILE', os.path.join(tempfile.gettempdir(), 'adaptive_backend_cohort_priors.json'))
+
+# Identical concurrent grading calls are coalesced across workers through this directory
+os.environ.setdefault('SINGLEFLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'adaptive_backend_singleflight'))
+
+
+def on_starting(server):
+    # Drop metrics left behind by a previous server run
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    # Publish the final metrics of a worker that is shutting down or being recycled
+    import metrics
+    metrics.flush(force=True)
+
+    # Write out the attempts still buffered in memory
+    app_module = sys.modules.get('app')
+    if app_module is not None and app_module.attempt_log is not None:
+        app_module.attempt_log.flush()
+
+    # Merge the cohort counts this worker has not shared yet
+    if app_module is not None:
+        app_module.cohort_priors.sync(force=True)
@@ -0,0 +1,143 @@
+"""
+Question selection within a difficulty tier.
+
+Once the difficulty policy has chosen a tier, an item selector picks which of
+the tier's available questions to serve. Per-question statistics are kept in
+arrays over the catalog's dense question index and shared by every session
+in the worker. An update is O(1), and a selection scores all candidates at
+once with array operations, so catalogs of 100k+ questions stay cheap.
+
+Selectors:
+  random    uniform choice (the original behaviour)
+  target    UCB-style score that prefers questions whose estimated success
+            rate is closest to target_rate, with a bonus for rarely seen ones
+  thompson  samples each candidate's success rate from its Beta posterior and
+            picks the sample closest to target_rate
+  calibrated  picks the question whose modelled success probability for the
+            learner's ability (see calibration.py) is closest to target_rate
+
+Only first attempts at a question update its statistics, so retries after a
+wrong answer do not inflate its success rate.
+
+The selector used by the API is chosen with the ITEM_SELECTOR and
+ITEM_SELECTOR_PARAMS (JSON) environment variables.
+"""
+import random
+import threading
+
+import numpy as np
+
+
+class ItemSelector:
+    """Base class: per-question attempt/success counts plus select/update"""
+
+    name = None
+
+    def __init__(self, n_questions, prior_successes=1.0, prior_failures=1.0, seed=None):
+        self.attempts = np.zeros(n_questions, dtype=np.float64)
+        self.successes = np.zeros(n_questions, dtype=np.float64)
+        self.total_attempts = 0
+        self.prior_successes = prior_successes
+        self.prior_failures = prior_failures
+        self.rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.attempts)
+
+    def update(self, question_index, correct):
+        """Record a first attempt at a question"""
+        with self._lock:
+            self.attempts[question_index] += 1
+            self.successes[question_index] += bool(correct)
+            self.total_attempts += 1
+
+    def success_rate(self, indices=None):
+        """Posterior mean success rate per question (all questions, or the given indices)"""
+        attempts = self.attempts if indices is None else self.attempts[indices]
+        successes = self.successes if indices is None else self.successes[indices]
+        return (successes + self.prior_successes) / (attempts + self.prior_successes + self.prior_failures)
+
+    def select(self, candidates, ability=None):
+        """Dense index of the question to serve, chosen from a non-empty array of candidates"""
+        raise NotImplementedError
+
+    def _argmax(self, scores, candidates):
+        """Best-scoring candidate, breaking ties at random"""
+        best = np.flatnonzero(scores == scores.max())
+        return int(candidates[best[0] if len(best) == 1 else self.rng.choice(best)])
+
+
+class RandomItemSelector(ItemSelector):
+    """Uniform choice among the candidates"""
+
+    name = 'random'
+
+    def select(self, candidates, ability=None):
+        return int(random.choice(candidates))
+
+
+class TargetSuccessSelector(ItemSelector):
+    """Prefer questions whose estimated success rate is closest to target_rate"""
+
+    name = 'target'
+
+    def __init__(self, n_questions, target_rate=0.7, exploration_param=0.3, **params):
+        super().__init__(n_questions, **params)
+        self.target_rate = target_rate
+        self.exploration_param = exploration_param
+
+    def select(self, candidates, ability=None):
+        candidates = np.asarray(candidates)
+        attempts = self.attempts[candidates]
+        rate = (self.successes[candidates] + self.prior_successes) / (attempts + self.prior_successes + self.prior_failures)
+        bonus = self.exploration_param * np.sqrt(np.log(self.total_attempts + 1) / (attempts + 1))
+        return self._argmax(bonus - np.abs(rate - self.target_rate), candidates)
+
+
+class ThompsonItemSelector(ItemSelector):
+    """Pick the candidate whose sampled success rate is closest to target_rate"""
+
+    name = 'thompson'
+
+    def __init__(self, n_questions, target_rate=0.7, **params):
+        super().__init__(n_questions, **params)
+        self.target_rate = target_rate
+
+    def select(self, candidates, ability=None):
+        candidates = np.asarray(candidates)
+        successes = self.successes[candidates]
+        samples = self.rng.beta(successes + self.prior_successes,
+                                self.attempts[candidates] - successes + self.prior_failures)
+        return self._argmax(-np.abs(samples - self.target_rate), candidates)
+
+
+class CalibratedItemSelector(ItemSelector):
+    """Pick the candidate whose calibrated success probability for the learner is closest to target_rate"""
+
+    name = 'calibrated'
+
+    def __init__(self, n_questions, calibration=None, target_rate=0.7, **params):
+        if calibration is None:
+            raise ValueError("The calibrated item selector needs a calibration")
+        super().__init__(n_questions, **params)
+        self.calibration = calibration
+        self.target_rate = target_rate
+
+    def select(self, candidates, ability=None):
+        candidates = np.asarray(candidates)
+        expected = self.calibration.expected(ability or 0.0, candidates)
+        return self._argmax(-np.abs(expected - self.target_rate), candidates)
+
+
+ITEM_SELECTORS = {
+    selector.name: selector
+    for selector in (RandomItemSelector, TargetSuccessSelector, ThompsonItemSelector, CalibratedItemSelector)
+}
+
+
+def make_item_selector(name, n_questions, **params):
+    """Instantiate a registered item selector by name"""
+    if name not in ITEM_SELECTORS:
+        raise ValueError(f"Unknown item selector '{name}'. Available: {', '.join(ITEM_SELECTORS)}")
+    return ITEM_SELECTORS[name](n_questions, **params)
@@ -0,0 +1,92 @@
+"""
+Bayesian Knowledge Tracing (BKT) over question categories.
+
+Every learner holds a mastery probability per category (the skills are the
+catalog's category_codes) in one float32 row of a shared array, indexed by
+slot like the difficulty policies. An answer updates the mastery of its
+category with the standard BKT posterior followed by the learning
+transition:
+
+    posterior = P(mastered | answer), using slip and guess probabilities
+    mastery   = posterior + (1 - posterior) * transit
+
+Batches of learners update with one vectorized gather/scatter, and
+weakest_skill() steers question selection toward the learner's least
+mastered category.
+"""
+import threading
+
+import numpy as np
+
+
+class KnowledgeTracer:
+    """BKT mastery per (learner slot, skill), with per-skill parameters"""
+
+    def __init__(self, n_skills, capacity=1024, p_init=0.2, p_transit=0.15, p_slip=0.1, p_guess=0.2):
+        self.n_skills = n_skills
+        # Parameters may be scalars or one value per skill
+        self.p_init = np.broadcast_to(np.asarray(p_init, dtype=np.float32), (n_skills,)).copy()
+        self.p_transit = np.broadcast_to(np.asarray(p_transit, dtype=np.float32), (n_skills,)).copy()
+        self.p_slip = np.broadcast_to(np.asarray(p_slip, dtype=np.float32), (n_skills,)).copy()
+        self.p_guess = np.broadcast_to(np.asarray(p_guess, dtype=np.float32), (n_skills,)).copy()
+        self.mastery = np.empty((0, n_skills), dtype=np.float32)
+        self.lock = threading.Lock()
+        self._free_slots = []
+        self._next_slot = 0
+        self.resize(capacity)
+
+    @property
+    def capacity(self):
+        return len(self.mastery)
+
+    def resize(self, capacity):
+        """Grow the mastery array to hold at least capacity learners"""
+        if capacity <= self.capacity:
+            return
+        grown = np.empty((max(capacity, 2 * self.capacity), self.n_skills), dtype=np.float32)
+        grown[:self.capacity] = self.mastery
+        grown[self.capacity:] = self.p_init
+        self.mastery = grown
+
+    def allocate(self):
+        """Reserve a slot for a new learner"""
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = self._next_slot
+        self._next_slot += 1
+        self.resize(self._next_slot)
+        return slot
+
+    def release(self, slot):
+        """Reset a learner's mastery and free the slot for reuse"""
+        self.mastery[slot] = self.p_init
+        self._free_slots.append(slot)
+
+    def update(self, slots, skills, correct):
+        """Record one answer per slot (slots must be unique within a call)"""
+        # Flat indices into the contiguous mastery array gather/scatter about twice as fast as 2-D indexing
+        cells = np.asarray(slots) * self.n_skills + skills
+        flat = self.mastery.reshape(-1)
+        mastery = flat[cells]
+        slip = self.p_slip[skills]
+        guess = self.p_guess[skills]
+        right = mastery * (1 - slip)
+        wrong = mastery * slip
+        posterior = np.where(correct,
+                             right / (right + (1 - mastery) * guess),
+                             wrong / (wrong + (1 - mastery) * (1 - guess)))
+        flat[cells] = posterior + (1 - posterior) * self.p_transit[skills]
+
+    def update_one(self, slot, skill, correct):
+        self.update(np.array([slot]), np.array([skill]), np.array([bool(correct)]))
+
+    def predict_correct(self, slots, skills):
+        """Probability of a correct answer given current mastery"""
+        mastery = self.mastery[slots, skills]
+        return mastery * (1 - self.p_slip[skills]) + (1 - mastery) * self.p_guess[skills]
+
+    def weakest_skill(self, slot, skills):
+        """Least mastered of the given skills"""
+        skills = np.asarray(skills)
+        mastery = self.mastery[slot, skills]
+        return int(skills[np.argmin(mastery)])
@@ -0,0 +1,325 @@
+"""
+Prometheus-style metrics for the adaptive backend.
+
+Counters, gauges and histograms are kept in a per-process registry. When the
+METRICS_DIR environment variable is set (gunicorn_config.py sets it), every
+worker periodically publishes a snapshot of its registry to that directory and
+the scrape endpoint merges the snapshots of all workers, so /metrics reports
+totals for the whole server regardless of which worker answers the scrape.
+Snapshots are named after the worker's pid and start time, so a worker that
+reuses an exited worker's pid does not overwrite its totals. Snapshots of
+workers that have exited are folded into an archive file so counters stay
+monotonic across worker restarts.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between snapshot writes of one worker
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', '1.0'))
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+_ARCHIVE_FILE = 'metrics_archive.json'
+_LOCK_FILE = 'metrics.lock'
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and histograms for one process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.definitions = {}  # name -> (kind, help, buckets)
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def register(self, name, kind, help_text, buckets=None):
+        """Declare a metric so it is exported with HELP/TYPE lines"""
+        if kind == 'histogram':
+            buckets = tuple(buckets or DEFAULT_BUCKETS)
+        self.definitions[name] = (kind, help_text, buckets)
+
+    def inc(self, name, amount=1.0, **labels):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.gauges[key] = float(value)
+
+    def observe(self, name, value, **labels):
+        """Record one observation in a histogram"""
+        buckets = self.definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            state = self.histograms.get(key)
+            if state is None:
+                state = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the duration of a block in a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of the registry values"""
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self.gauges.items()],
+                'histograms': [[name, list(labels), list(state)] for (name, labels), state in self.histograms.items()],
+            }
+
+
+def _merge(totals, snapshot, include_gauges=True):
+    """Add a snapshot's values into merged totals"""
+    for name, labels, value in snapshot.get('counters', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        totals['counters'][key] = totals['counters'].get(key, 0.0) + value
+    if include_gauges:
+        for name, labels, value in snapshot.get('gauges', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            totals['gauges'][key] = totals['gauges'].get(key, 0.0) + value
+    for name, labels, state in snapshot.get('histograms', []):
+        key = (name, tuple(tuple(pair) for pair in labels))
+        merged = totals['histograms'].get(key)
+        if merged is None:
+            totals['histograms'][key] = list(state)
+        else:
+            totals['histograms'][key] = [a + b for a, b in zip(merged, state)]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start(pid):
+    """Start time of a process in clock ticks since boot, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _snapshot_alive(pid, start):
+    """Whether the worker that wrote a snapshot is still running (not just some process with its pid)"""
+    if not _pid_alive(pid):
+        return False
+    current = _process_start(pid)
+    return current is None or current == start
+
+
+def _write_json(path, data):
+    """Atomically replace a JSON file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+_flusher_pid = None
+_flush_lock = threading.Lock()
+_snapshot_path = None  # (pid, path) of the snapshot file claimed by this process
+_snapshot_lock = threading.Lock()
+
+
+def _claim_snapshot_path():
+    """This worker's snapshot file, created exclusively on first use (called with _snapshot_lock held)"""
+    global _snapshot_path
+    pid = os.getpid()
+    if _snapshot_path is None or _snapshot_path[0] != pid:
+        start = _process_start(pid)
+        if start is None:
+            start = time.time_ns()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        while True:
+            path = os.path.join(METRICS_DIR, f'metrics_{pid}_{start}.json')
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                break
+            except FileExistsError:
+                start += 1
+        _snapshot_path = (pid, path)
+    return _snapshot_path[1]
+
+
+def _write_snapshot():
+    try:
+        with _snapshot_lock:
+            _write_json(_claim_snapshot_path(), registry.snapshot())
+    except OSError:
+        pass
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _write_snapshot()
+
+
+def flush(force=False):
+    """Publish this worker's snapshot to METRICS_DIR.
+
+    Unless forced, this only makes sure the worker's background publisher is running;
+    it then writes a snapshot every FLUSH_INTERVAL seconds.
+    """
+    global _flusher_pid
+    if not METRICS_DIR:
+        return
+    if force:
+        _write_snapshot()
+    if _flusher_pid != os.getpid():
+        with _flush_lock:
+            # Threads do not survive fork, so each worker starts its own publisher
+            if _flusher_pid != os.getpid():
+                _flusher_pid = os.getpid()
+                threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _collect():
+    """Merge the snapshots of all workers (or just this process without METRICS_DIR)"""
+    totals = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    if not METRICS_DIR:
+        _merge(totals, registry.snapshot())
+        return totals
+
+    flush(force=True)
+    lock_path = os.path.join(METRICS_DIR, _LOCK_FILE)
+    with open(lock_path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            archive_path = os.path.join(METRICS_DIR, _ARCHIVE_FILE)
+            archive = _read_json(archive_path) or {}
+            archive_changed = False
+
+            for filename in os.listdir(METRICS_DIR):
+                if not (filename.startswith('metrics_') and filename.endswith('.json')) or filename == _ARCHIVE_FILE:
+                    continue
+                path = os.path.join(METRICS_DIR, filename)
+                snapshot = _read_json(path)
+                if snapshot is None:
+                    continue
+                try:
+                    pid, start = (int(part) for part in filename[len('metrics_'):-len('.json')].split('_'))
+                except ValueError:
+                    continue
+                if _snapshot_alive(pid, start):
+                    _merge(totals, snapshot)
+                else:
+                    # Fold exited workers into the archive; their gauges no longer apply
+                    folded = {'counters': {}, 'gauges': {}, 'histograms': {}}
+                    _merge(folded, archive, include_gauges=False)
+                    _merge(folded, snapshot, include_gauges=False)
+                    archive = {
+                        'counters': [[n, list(l), v] for (n, l), v in folded['counters'].items()],
+                        'histograms': [[n, list(l), s] for (n, l), s in folded['histograms'].items()],
+                    }
+                    archive_changed = True
+                    os.remove(path)
+
+            if archive_changed:
+                _write_json(archive_path, archive)
+            _merge(totals, archive, include_gauges=False)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return totals
+
+
+def render_latest():
+    """Render all metrics in the Prometheus text exposition format"""
+    totals = _collect()
+    lines = []
+    for name in sorted(registry.definitions):
+        kind, help_text, buckets = registry.definitions[name]
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), state in sorted(totals['histograms'].items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, state):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, ("le", repr(float(bound))))} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {state[-1]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {repr(float(state[-2]))}')
+                lines.append(f'{name}_count{_format_labels(labels)} {state[-1]}')
+        else:
+            values = totals['counters'] if kind == 'counter' else totals['gauges']
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics exported by the application
+registry.register('http_request_duration_seconds', 'histogram', 'Latency of API requests by route')
+registry.register('grading_total', 'counter', 'Answers graded, by grading path')
+registry.register('grading_duration_seconds', 'histogram', 'Time spent grading an answer, by grading path')
+registry.register('grading_confidence', 'histogram', 'Confidence of the deciding grading tier, by grading path',
+                  buckets=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0))
+registry.register('gemini_requests_total', 'counter', 'Gemini grading calls, by outcome')
+registry.register('gemini_request_duration_seconds', 'histogram', 'Latency of Gemini grading calls')
+registry.register('singleflight_total', 'counter', 'Coalesced calls, by flight and role (leader, follower, shared, timeout)')
+registry.register('active_sessions', 'gauge', 'Question systems currently held by the workers')
+registry.register('difficulty_selections_total', 'counter', 'Questions served, by selected difficulty')
+
+# Module-level shortcuts
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+time_block = registry.time
@@ -0,0 +1,73 @@
+"""
+Placement test: locate a new learner's level in a few answers.
+
+Instead of climbing one tier per two correct answers, a placement test keeps
+a posterior over the learner's ability on a fixed grid. It serves the
+question with the highest expected Fisher information under that posterior,
+using the calibrated difficulties from calibration.py. Each answer
+multiplies the posterior by the 1PL likelihood. The test ends after
+max_items answers or once the posterior is narrow enough. The learner then
+starts at the hardest tier where their expected success is at least
+target_rate.
+"""
+import numpy as np
+
+# Ability grid (logit scale) for the posterior
+ABILITY_GRID = np.linspace(-4.0, 4.0, 81)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class PlacementTest:
+    """Grid posterior over one learner's ability with max-information question selection"""
+
+    def __init__(self, calibration, prior_mean=0.0, prior_sd=1.5, max_items=5, target_sd=0.6,
+                 target_rate=0.6, grid=ABILITY_GRID):
+        self.calibration = calibration
+        self.max_items = max_items
+        self.target_sd = target_sd
+        self.target_rate = target_rate
+        self.grid = grid
+        self.log_posterior = -0.5 * ((grid - prior_mean) / prior_sd) ** 2
+        self.answered = 0
+
+    def posterior(self):
+        weights = np.exp(self.log_posterior - self.log_posterior.max())
+        return weights / weights.sum()
+
+    @property
+    def mean(self):
+        return float(self.posterior() @ self.grid)
+
+    @property
+    def sd(self):
+        posterior = self.posterior()
+        mean = posterior @ self.grid
+        return float(np.sqrt(posterior @ (self.grid - mean) ** 2))
+
+    @property
+    def done(self):
+        return self.answered >= self.max_items or self.sd <= self.target_sd
+
+    def select(self, candidates):
+        """Candidate question with the highest expected information about the learner's ability"""
+        candidates = np.asarray(candidates)
+        p = _sigmoid(self.grid[None, :] - self.calibration.difficulty[candidates][:, None])
+        information = (p * (1 - p)) @ self.posterior()
+        return int(candidates[np.argmax(information)])
+
+    def update(self, question_index, correct):
+        """Fold one answer into the posterior"""
+        p = _sigmoid(self.grid - self.calibration.difficulty[question_index])
+        self.log_posterior += np.log(p if correct else 1 - p)
+        self.answered += 1
+
+    def level(self):
+        """Hardest tier whose mean calibrated difficulty the learner answers at target_rate or better"""
+        catalog = self.calibration.catalog
+        tier_difficulty = np.array([self.calibration.difficulty[catalog.tier_indices[d]].mean()
+                                    for d in range(catalog.n_difficulties)])
+        reachable = np.flatnonzero(_sigmoid(self.mean - tier_difficulty) >= self.target_rate)
+        return int(reachable.max()) if len(reachable) else 0
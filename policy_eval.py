@@ -0,0 +1,248 @@
+"""
+Parallel policy evaluation over simulated learners.
+
+Every configuration (a policy from difficulty_policies.py with its
+parameters, plus a learner ability profile) is split into shards of learners.
+Shards run on a process pool, each with its own seed spawned
+deterministically from the base seed, so results do not depend on the number
+of workers or on completion order. Per-shard metrics are streamed to a
+columnar output directory as shards finish, then aggregated per
+configuration:
+  - time-to-Hard and time to each learner's target level,
+  - regret,
+  - frustration,
+  - accuracy per difficulty.
+
+Usage:
+  python policy_eval.py --exploration 0.5,1.0,1.414,2.0 --learners 200000 --steps 50 \\
+      --profile logistic --output eval_results
+  python policy_eval.py --policy sw_ucb --policy-params '{"window": 10}' --exploration 1.0
+  python policy_eval.py --policy thompson,rules
+"""
+import argparse
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from difficulty_policies import POLICIES
+from simulation import simulate
+
+N_DIFFICULTIES = 3
+
+# Columns written per shard
+SHARD_COLUMNS = {
+    'config_id': np.int32,
+    'shard_id': np.int32,
+    'n_learners': np.int64,
+    'reached_hard': np.int64,
+    'time_to_hard_sum': np.int64,
+    'regret_sum': np.float64,
+    'time_to_level_sum': np.int64,
+    'frustrated_steps': np.int64,
+    **{f'attempts_{d}': np.int64 for d in range(N_DIFFICULTIES)},
+    **{f'correct_{d}': np.int64 for d in range(N_DIFFICULTIES)},
+}
+
+
+class ColumnarWriter:
+    """Append-only columnar output: one raw binary file per column plus a schema"""
+
+    def __init__(self, directory, columns):
+        self.directory = directory
+        self.columns = {name: np.dtype(dtype) for name, dtype in columns.items()}
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'schema.json'), 'w') as f:
+            json.dump({name: dtype.str for name, dtype in self.columns.items()}, f, indent=4)
+        self._files = {name: open(os.path.join(directory, f'{name}.bin'), 'wb') for name in self.columns}
+
+    def append(self, row):
+        """Append one row (a dict with a value for every column)"""
+        for name, dtype in self.columns.items():
+            self._files[name].write(np.asarray(row[name], dtype=dtype).tobytes())
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+def read_columns(directory):
+    """Load a directory written by ColumnarWriter into a dict of arrays"""
+    with open(os.path.join(directory, 'schema.json'), 'r') as f:
+        schema = json.load(f)
+    return {name: np.fromfile(os.path.join(directory, f'{name}.bin'), dtype=np.dtype(dtype))
+            for name, dtype in schema.items()}
+
+
+def make_shards(configs, shard_size, seed):
+    """Split every configuration into learner shards with deterministic seeds"""
+    shards = []
+    for config_id, config in enumerate(configs):
+        n_learners = config['n_learners']
+        for start in range(0, n_learners, shard_size):
+            shards.append({
+                'config_id': config_id,
+                'shard_id': len(shards),
+                'n_learners': min(shard_size, n_learners - start),
+                'config': config,
+            })
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    for shard, shard_seed in zip(shards, seeds):
+        shard['seed'] = shard_seed
+    return shards
+
+
+def run_shard(shard):
+    """Simulate one shard and reduce it to summable metrics"""
+    config = shard['config']
+    result = simulate(
+        n_learners=shard['n_learners'],
+        n_steps=config['n_steps'],
+        profile=config.get('profile', 'default'),
+        exploration_param=config.get('exploration_param'),
+        seed=shard['seed'],
+        policy=config.get('policy', 'agent'),
+        policy_params=config.get('policy_params'),
+        **config.get('profile_params', {})
+    )
+
+    time_to_hard = result.time_to_difficulty(N_DIFFICULTIES - 1)
+    reached = time_to_hard >= 0
+    flat_difficulty = result.difficulty.ravel()
+    attempts = np.bincount(flat_difficulty, minlength=N_DIFFICULTIES)
+    correct = np.bincount(flat_difficulty, weights=result.is_correct.ravel(), minlength=N_DIFFICULTIES)
+
+    row = {
+        'config_id': shard['config_id'],
+        'shard_id': shard['shard_id'],
+        'n_learners': shard['n_learners'],
+        'reached_hard': int(reached.sum()),
+        'time_to_hard_sum': int(time_to_hard[reached].sum()),
+        'regret_sum': float(result.regret().sum()),
+        'time_to_level_sum': int(result.time_to_level().sum()),
+        'frustrated_steps': int(result.frustration().sum()),
+    }
+    for d in range(N_DIFFICULTIES):
+        row[f'attempts_{d}'] = int(attempts[d])
+        row[f'correct_{d}'] = int(correct[d])
+    return row
+
+
+def aggregate(columns, configs):
+    """Combine shard rows into per-configuration metrics"""
+    summaries = []
+    for config_id, config in enumerate(configs):
+        mask = columns['config_id'] == config_id
+        n_learners = int(columns['n_learners'][mask].sum())
+        reached = int(columns['reached_hard'][mask].sum())
+        summary = {
+            'config': config,
+            'n_learners': n_learners,
+            'share_reaching_hard': reached / n_learners if n_learners else float('nan'),
+            'mean_time_to_hard': columns['time_to_hard_sum'][mask].sum() / reached if reached else float('nan'),
+            'mean_regret': columns['regret_sum'][mask].sum() / n_learners if n_learners else float('nan'),
+            # Steps until the learner is first served their target level (censored at n_steps)
+            'mean_time_to_level': columns['time_to_level_sum'][mask].sum() / n_learners if n_learners else float('nan'),
+            # Share of answers that were the third (or later) wrong answer in a row
+            'frustration': (columns['frustrated_steps'][mask].sum() / (n_learners * config['n_steps'])
+                            if n_learners else float('nan')),
+            'accuracy_by_difficulty': [],
+        }
+        for d in range(N_DIFFICULTIES):
+            attempts = columns[f'attempts_{d}'][mask].sum()
+            summary['accuracy_by_difficulty'].append(
+                float(columns[f'correct_{d}'][mask].sum() / attempts) if attempts else float('nan'))
+        summaries.append(summary)
+    return summaries
+
+
+def json_safe(value):
+    """Copy of a summary structure with numpy scalars as Python numbers and NaN as None"""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def evaluate(configs, output_dir, shard_size=10000, seed=0, max_workers=None):
+    """Run all configurations in parallel and return per-configuration summaries"""
+    shards = make_shards(configs, shard_size, seed)
+    writer = ColumnarWriter(output_dir, SHARD_COLUMNS)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(run_shard, shard) for shard in shards]
+            for future in as_completed(futures):
+                writer.append(future.result())
+                writer.flush()
+    finally:
+        writer.close()
+
+    summaries = aggregate(read_columns(output_dir), configs)
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as f:
+        json.dump(json_safe(summaries), f, indent=4, allow_nan=False)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate difficulty policies on simulated learners")
+    parser.add_argument('--policy', default='agent', help=f"Comma-separated policies: {', '.join(POLICIES)}")
+    parser.add_argument('--policy-params', default='{}', help='JSON parameters passed to every policy')
+    parser.add_argument('--exploration', default=None,
+                        help='Comma-separated exploration_param values (UCB policies only)')
+    parser.add_argument('--profile', default='logistic', help='Ability profile (default, logistic, uniform)')
+    parser.add_argument('--learners', type=int, default=100000, help='Learners per configuration')
+    parser.add_argument('--steps', type=int, default=50, help='Answers per learner')
+    parser.add_argument('--shard-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help='Processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='eval_results', help='Output directory')
+    args = parser.parse_args()
+
+    policy_params = json.loads(args.policy_params)
+    explorations = [float(c) for c in args.exploration.split(',')] if args.exploration else [None]
+    policies = args.policy.split(',')
+    unknown = [policy for policy in policies if policy not in POLICIES]
+    if unknown:
+        parser.error(f"unknown policies {', '.join(unknown)}. Available: {', '.join(POLICIES)}")
+    # exploration_param only applies to the policies whose constructor takes it
+    explores = {policy: 'exploration_param' in inspect.signature(POLICIES[policy]).parameters
+                for policy in policies}
+    if args.exploration and not any(explores.values()):
+        parser.error(f"--exploration does not apply to {', '.join(policies)}")
+    configs = []
+    for policy in policies:
+        for exploration in (explorations if explores[policy] else [None]):
+            config = {'policy': policy, 'policy_params': dict(policy_params), 'profile': args.profile,
+                      'n_learners': args.learners, 'n_steps': args.steps}
+            if exploration is not None:
+                config['exploration_param'] = exploration
+            configs.append(config)
+    start = time.perf_counter()
+    summaries = evaluate(configs, args.output, args.shard_size, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'policy':>14} {'exploration':>12} {'reach Hard':>11} {'t->Hard':>8} {'regret':>8}  accuracy (E/M/H)")
+    for summary in summaries:
+        config = summary['config']
+        accuracy = '/'.join(f"{a:.2f}" for a in summary['accuracy_by_difficulty'])
+        exploration = config.get('exploration_param')
+        exploration = f"{exploration:.3f}" if exploration is not None else '-'
+        print(f"{config['policy']:>14} {exploration:>12} {summary['share_reaching_hard']:>11.3f} "
+              f"{summary['mean_time_to_hard']:>8.2f} {summary['mean_regret']:>8.2f}  {accuracy}")
+    print(f"\n{sum(s['n_learners'] for s in summaries)} learners in {elapsed:.1f}s; results in {args.output}/")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Opt-in sampled profiling of live requests.
+
+A profiled request runs with a background stack sampler that records the
+handler thread's call stack every PROFILE_INTERVAL_MS milliseconds. Samples
+are aggregated per route and can be exported in the collapsed-stack format
+read by flamegraph.pl, speedscope and inferno.
+
+A request is profiled when either:
+  - PROFILE_SAMPLE_EVERY is N > 0 and it is the N-th request of the worker, or
+  - it carries an `X-Profile: 1` header together with a valid `X-Admin-Token`.
+
+The sampling rate can be changed and profiles dumped at runtime through the
+admin endpoints in app.py, without restarting the worker. Profiles are kept
+per worker process.
+"""
+import hmac
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '1'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Deepest stack kept per sample
+MAX_STACK_DEPTH = 128
+
+
+class RouteProfile:
+    """Samples aggregated over all profiled requests of one route"""
+
+    __slots__ = ('requests', 'seconds', 'stacks')
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.stacks = Counter()  # collapsed stack -> sample count
+
+
+class RequestProfiler:
+    """Samples one thread's call stack from a background thread until stopped"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_MS / 1000.0):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self.start_time = None
+        self.duration = 0.0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self.duration = time.perf_counter() - self.start_time
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    """Render a frame chain root-first as 'module:function;module:function'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+_lock = threading.Lock()
+_profiles = {}  # route -> RouteProfile
+_request_counter = itertools.count(1)
+sample_every = PROFILE_SAMPLE_EVERY
+
+
+def is_admin(token):
+    """Check an admin token; admin features are disabled when ADMIN_TOKEN is unset"""
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def should_profile(headers):
+    """Decide whether the incoming request is profiled"""
+    if headers.get('X-Profile') == '1' and is_admin(headers.get('X-Admin-Token')):
+        return True
+    return sample_every > 0 and next(_request_counter) % sample_every == 0
+
+
+def start(thread_id=None):
+    """Start profiling the calling (or given) thread"""
+    return RequestProfiler(thread_id or threading.get_ident()).start()
+
+
+def record(route, profiler):
+    """Stop a request profiler and fold its samples into the route's profile"""
+    profiler.stop()
+    with _lock:
+        profile = _profiles.get(route)
+        if profile is None:
+            profile = _profiles[route] = RouteProfile()
+        profile.requests += 1
+        profile.seconds += profiler.duration
+        profile.stacks.update(profiler.stacks)
+
+
+def set_sample_every(n):
+    """Change the sampling rate at runtime (0 disables sampled profiling)"""
+    global sample_every
+    sample_every = max(0, int(n))
+
+
+def reset():
+    with _lock:
+        _profiles.clear()
+
+
+def summary():
+    """Per-route request counts, profiled time and sample counts"""
+    with _lock:
+        return {
+            route: {
+                'requests': profile.requests,
+                'seconds': round(profile.seconds, 6),
+                'samples': sum(profile.stacks.values()),
+            }
+            for route, profile in _profiles.items()
+        }
+
+
+def collapsed(route=None):
+    """Collapsed stacks for one route, or for all routes under a per-route root frame"""
+    lines = []
+    with _lock:
+        routes = [route] if route else sorted(_profiles)
+        for name in routes:
+            profile = _profiles.get(name)
+            if profile is None:
+                continue
+            prefix = '' if route else f"{name};"
+            for stack, count in profile.stacks.most_common():
+                lines.append(f"{prefix}{stack} {count}")
+    return '\n'.join(lines) + ('\n' if lines else '')
+
+
+def dump(directory=PROFILE_DIR):
+    """Write one collapsed-stack file per route; returns the written paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for route in list(summary()):
+        safe_route = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(directory, f"{safe_route}_{os.getpid()}.folded")
+        with open(path, 'w') as f:
+            f.write(collapsed(route))
+        paths.append(path)
+    return paths
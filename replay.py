@@ -0,0 +1,171 @@
+"""
+Offline replay of production attempt logs through difficulty policies
+(see difficulty_policies.py).
+
+Attempt logs (see result_store.ATTEMPT_DTYPE) are read chunk by chunk
+through a generator pipeline. The events of each chunk are replayed through
+every policy in vectorized rounds. Each round takes at most one event per
+session, so a session's events are applied in order while all sessions
+advance together with array operations. Memory depends on the number of
+sessions, not on the number of events. Only adaptive answers are replayed,
+since placement and review answers never move the served difficulty.
+
+For every event, each policy proposes the difficulty it would have served
+before seeing the outcome. Its state is then updated with the logged
+difficulty and outcome. The counterfactual metrics are:
+  - agreement with the logged difficulty,
+  - the distribution of proposed difficulties,
+  - the replay estimate of accuracy: logged accuracy over the events where
+    the policy agreed with the log.
+
+Usage:
+  python replay.py ATTEMPT_LOG_DIR [--policies rules,agent,thompson] [--chunk-size 1000000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from difficulty_policies import N_DIFFICULTIES, POLICIES, make_policy
+from result_store import SOURCE_ADAPTIVE, iter_spilled_chunks
+
+
+class PolicyMetrics:
+    """Counterfactual metrics accumulated over replayed events"""
+
+    def __init__(self, n_difficulties=N_DIFFICULTIES):
+        self.events = 0
+        self.agreed = 0
+        self.agreed_correct = 0
+        self.proposed = np.zeros(n_difficulties, dtype=np.int64)
+
+    def add(self, proposed, logged, correct):
+        agree = proposed == logged
+        self.events += len(proposed)
+        self.agreed += int(agree.sum())
+        self.agreed_correct += int((agree & correct).sum())
+        self.proposed += np.bincount(proposed, minlength=len(self.proposed))
+
+    def summary(self):
+        return {
+            'events': self.events,
+            'agreement': self.agreed / self.events if self.events else float('nan'),
+            'replay_accuracy': self.agreed_correct / self.agreed if self.agreed else float('nan'),
+            'proposed_share': (self.proposed / max(self.events, 1)).tolist(),
+        }
+
+
+def iter_chunks(source, chunk_size=None):
+    """Yield structured event chunks from a log directory or an iterable of arrays, re-chunked if asked"""
+    chunks = iter_spilled_chunks(source) if isinstance(source, str) else iter(source)
+    if chunk_size is None:
+        yield from chunks
+        return
+    pending = []
+    pending_size = 0
+    for chunk in chunks:
+        pending.append(np.asarray(chunk))
+        pending_size += len(chunk)
+        while pending_size >= chunk_size:
+            merged = np.concatenate(pending)
+            yield merged[:chunk_size]
+            pending = [merged[chunk_size:]]
+            pending_size = len(pending[0])
+    if pending_size:
+        yield np.concatenate(pending)
+
+
+class ReplayEngine:
+    """Replays event chunks through a set of policies"""
+
+    def __init__(self, policies):
+        self.policies = policies
+        self.metrics = {policy.name: PolicyMetrics(policy.n_difficulties) for policy in policies}
+        self.session_slots = {}  # session id -> dense slot
+        self.logged = PolicyMetrics()
+
+    def _slots_for(self, session_ids):
+        """Map session ids to dense state slots, allocating new ones as needed"""
+        unique_ids, inverse = np.unique(session_ids, return_inverse=True)
+        slots = self.session_slots
+        unique_slots = np.fromiter((slots.setdefault(int(s), len(slots)) for s in unique_ids),
+                                   dtype=np.int64, count=len(unique_ids))
+        for policy in self.policies:
+            policy.resize(len(slots))
+        return unique_slots[inverse]
+
+    def process_chunk(self, chunk):
+        """Replay one chunk of events (ordered in time within each session)"""
+        # Placement and review answers do not move the served difficulty
+        chunk = chunk[np.asarray(chunk['source']) == SOURCE_ADAPTIVE]
+        slots = self._slots_for(chunk['session_id'])
+        difficulties = np.asarray(chunk['difficulty'], dtype=np.int8)
+        correct = np.asarray(chunk['is_correct'], dtype=bool)
+        hint_levels = np.asarray(chunk['hint_level'])
+
+        # Rank of every event among its session's events in this chunk
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        group_start = np.r_[0, np.flatnonzero(np.diff(sorted_slots)) + 1]
+        group_sizes = np.diff(np.r_[group_start, len(sorted_slots)])
+        rank = np.empty(len(slots), dtype=np.int64)
+        rank[order] = np.arange(len(slots)) - np.repeat(group_start, group_sizes)
+
+        # One vectorized round per rank: every session advances by at most one event
+        events_by_rank = np.argsort(rank, kind='stable')
+        bounds = np.searchsorted(rank[events_by_rank], np.arange(rank.max() + 2 if len(rank) else 1))
+        for r in range(len(bounds) - 1):
+            events = events_by_rank[bounds[r]:bounds[r + 1]]
+            round_slots = slots[events]
+            round_difficulties = difficulties[events]
+            round_correct = correct[events]
+            round_hints = hint_levels[events]
+            for policy in self.policies:
+                proposed = policy.select(round_slots)
+                self.metrics[policy.name].add(proposed, round_difficulties, round_correct)
+                policy.update(round_slots, round_difficulties, round_correct, hint_levels=round_hints)
+            self.logged.add(round_difficulties, round_difficulties, round_correct)
+
+    def run(self, chunks):
+        for chunk in chunks:
+            self.process_chunk(chunk)
+        return self.report()
+
+    def report(self):
+        logged = self.logged.summary()
+        return {
+            'events': logged['events'],
+            'sessions': len(self.session_slots),
+            'logged_accuracy': logged['replay_accuracy'],
+            'logged_share': logged['proposed_share'],
+            'policies': {name: metrics.summary() for name, metrics in self.metrics.items()},
+        }
+
+
+def replay(source, policy_names=('rules', 'agent'), chunk_size=None):
+    """Replay an attempt log directory (or iterable of chunks) and return the metrics"""
+    engine = ReplayEngine([make_policy(name) for name in policy_names])
+    return engine.run(iter_chunks(source, chunk_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay attempt logs through difficulty policies")
+    parser.add_argument('log_dir', help='Directory with attempts_*.npy chunks (ATTEMPT_LOG_DIR)')
+    parser.add_argument('--policies', default='rules,agent', help=f"Comma-separated: {', '.join(POLICIES)}")
+    parser.add_argument('--chunk-size', type=int, default=None, help='Re-chunk events to this size')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = replay(args.log_dir, args.policies.split(','), args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"{report['events']} events from {report['sessions']} sessions in {elapsed:.1f}s")
+    print(f"logged: accuracy {report['logged_accuracy']:.3f}, difficulty share "
+          f"{'/'.join(f'{s:.2f}' for s in report['logged_share'])}")
+    for name, summary in report['policies'].items():
+        print(f"{name:>14}: agreement {summary['agreement']:.3f}, replay accuracy {summary['replay_accuracy']:.3f}, "
+              f"proposed share {'/'.join(f'{s:.2f}' for s in summary['proposed_share'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Compact JSON encoding and compression negotiation for API responses.
+
+Payloads are encoded with orjson when it is installed (falling back to the
+standard library encoder with compact separators) and compressed with brotli
+or gzip according to the client's Accept-Encoding header. Payloads that never
+change for a given key (e.g. formatted questions) can be cached together with
+their precompressed variants so repeated responses skip both steps.
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from flask import Response, request
+
+import tracing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = 256
+
+# Maximum number of cached static payloads
+CACHE_SIZE = 4096
+
+# Compression levels for per-request payloads (fast) and cached payloads (compressed once)
+GZIP_LEVEL = 5
+GZIP_LEVEL_CACHED = 9
+BROTLI_QUALITY = 4
+BROTLI_QUALITY_CACHED = 11
+
+_cache = OrderedDict()  # cache_key -> {encoding: body}
+_cache_lock = threading.Lock()
+
+
+def _default(obj):
+    """Serialize NumPy values that the standard encoder does not understand"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Encode a payload as compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick the best supported content coding from an Accept-Encoding header"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        fields = part.strip().split(';')
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    def allowed(coding):
+        return accepted.get(coding, accepted.get('*', 0.0)) > 0
+
+    if brotli is not None and allowed('br'):
+        return 'br'
+    if allowed('gzip'):
+        return 'gzip'
+    return 'identity'
+
+
+def compress(body, encoding, cached=False):
+    """Compress an encoded body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY_CACHED if cached else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL_CACHED if cached else GZIP_LEVEL)
+    return body
+
+
+def _cached_body(cache_key, payload, encoding):
+    """Return (body, compressed) for a static payload, encoding it at most once per coding"""
+    with _cache_lock:
+        variants = _cache.get(cache_key)
+        if variants is not None:
+            _cache.move_to_end(cache_key)
+            body = variants.get(encoding)
+            if body is not None:
+                return body, body is not variants['identity']
+
+    if variants is None:
+        variants = {'identity': dumps(payload)}
+    identity = variants['identity']
+    body = compress(identity, encoding, cached=True) if len(identity) >= MIN_COMPRESS_SIZE else identity
+    variants = dict(variants, **{encoding: body})
+
+    with _cache_lock:
+        _cache[cache_key] = variants
+        _cache.move_to_end(cache_key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return body, body is not identity
+
+
+def json_response(payload, status=200, cache_key=None):
+    """Build a compact, compressed JSON response.
+
+    Pass a cache_key only for payloads that are identical every time they are built
+    for that key; their encoded and compressed variants are then reused.
+    """
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+
+    with tracing.span('serialize', encoding=encoding, cached=cache_key is not None):
+        if cache_key is not None:
+            body, compressed = _cached_body(cache_key, payload, encoding)
+        else:
+            body = dumps(payload)
+            compressed = encoding != 'identity' and len(body) >= MIN_COMPRESS_SIZE
+            if compressed:
+                body = compress(body, encoding)
+
+    response = Response(body, status=status, mimetype='application/json')
+    if compressed:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def clear_cache():
+    """Drop all cached payloads"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,214 @@
+"""
+Columnar, typed storage for per-step results and attempt logs.
+
+Records are kept in fixed-size chunks of NumPy structured arrays instead of a
+list of dicts, which is roughly 20-40x smaller per record. Full chunks can be
+spilled to .npy files in a spill directory and are then read back through
+memory maps, so long simulations and production attempt logs do not have to
+fit in memory.
+"""
+import glob
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+# Per-step results of UCBTrainer.train_step
+TRAINING_RESULT_DTYPE = np.dtype([
+    ('question_index', np.int32),
+    ('difficulty', np.int8),
+    ('is_correct', np.bool_),
+    ('reward', np.float32),
+    ('consecutive_correct', np.int16),
+])
+
+# Answers checked by the API (one record per /api/check). Questions are identified by
+# question_key rather than by catalog position, which changes whenever the bank does.
+ATTEMPT_DTYPE = np.dtype([
+    ('timestamp', np.float64),
+    ('session_id', np.uint64),
+    ('question_key', np.uint64),
+    ('difficulty', np.int8),
+    ('is_correct', np.bool_),
+    ('hint_level', np.int8),
+    ('wrong_attempts', np.int16),
+    ('first_attempt', np.bool_),  # First answer since the question was served
+    ('source', np.int8),  # SOURCE_* below
+])
+
+# Where an attempt came from: normal adaptation, the placement test or a spaced review
+SOURCE_ADAPTIVE, SOURCE_PLACEMENT, SOURCE_REVIEW = 0, 1, 2
+
+
+def question_key(question_id):
+    """Stable 64-bit key of a question id, for typed logs that outlive the catalog order"""
+    return int.from_bytes(hashlib.blake2b(question_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class ResultStore:
+    """Append-only chunked store of structured records.
+
+    With a spill_dir, chunks beyond max_memory_chunks are written to
+    <spill_dir>/<prefix>_<pid>_<n>.npy, oldest first.
+    """
+
+    def __init__(self, dtype, chunk_size=65536, spill_dir=None, max_memory_chunks=4, prefix='results'):
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.spill_dir = spill_dir
+        self.max_memory_chunks = max_memory_chunks
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._chunks = []  # Full chunks: structured arrays, or spill paths once written to disk
+        self._current = None  # Allocated on first append so empty stores stay cheap
+        self._current_size = 0
+        self._spilled = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, record):
+        """Append one record given as a mapping of field name -> value"""
+        with self._lock:
+            if self._current is None:
+                self._current = np.empty(self.chunk_size, dtype=self.dtype)
+            row = self._current[self._current_size]
+            for name in self.dtype.names:
+                row[name] = record[name]
+            self._current_size += 1
+            self._length += 1
+            if self._current_size == self.chunk_size:
+                self._seal_current()
+
+    def append_batch(self, columns):
+        """Append many records given as a structured array or a mapping of equal-length arrays.
+
+        Scalar values in the mapping are broadcast to every record.
+        """
+        if isinstance(columns, np.ndarray) and columns.dtype.names:
+            batch = columns.astype(self.dtype, copy=False)
+        else:
+            lengths = {len(columns[name]) for name in self.dtype.names if np.ndim(columns[name]) > 0}
+            if len(lengths) > 1:
+                raise ValueError("All columns must have the same length")
+            batch = np.empty(lengths.pop() if lengths else 1, dtype=self.dtype)
+            for name in self.dtype.names:
+                batch[name] = columns[name]
+
+        with self._lock:
+            offset = 0
+            while offset < len(batch):
+                if self._current is None:
+                    self._current = np.empty(self.chunk_size, dtype=self.dtype)
+                take = min(self.chunk_size - self._current_size, len(batch) - offset)
+                self._current[self._current_size:self._current_size + take] = batch[offset:offset + take]
+                self._current_size += take
+                self._length += take
+                offset += take
+                if self._current_size == self.chunk_size:
+                    self._seal_current()
+
+    def _seal_current(self):
+        """Move the current chunk to the list of full chunks (called with the lock held)"""
+        self._chunks.append(self._current[:self._current_size].copy() if self._current_size < self.chunk_size
+                            else self._current)
+        self._current = None
+        self._current_size = 0
+        self._maybe_spill()
+
+    def _maybe_spill(self):
+        if self.spill_dir is None:
+            return
+        in_memory = [i for i, chunk in enumerate(self._chunks) if isinstance(chunk, np.ndarray)]
+        for i in in_memory[:max(0, len(in_memory) - self.max_memory_chunks)]:
+            self._chunks[i] = self._spill(self._chunks[i])
+
+    def _spill(self, chunk):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Exclusive create: a later process with a reused pid skips past the files already there
+        while True:
+            path = os.path.join(self.spill_dir, f'{self.prefix}_{os.getpid()}_{self._spilled:06d}.npy')
+            self._spilled += 1
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, chunk)
+            return path
+
+    def flush(self):
+        """Spill every in-memory record, including the partial current chunk"""
+        if self.spill_dir is None:
+            return
+        with self._lock:
+            if self._current_size:
+                self._seal_current()
+            self._chunks = [self._spill(chunk) if isinstance(chunk, np.ndarray) else chunk
+                            for chunk in self._chunks]
+
+    def iter_chunks(self):
+        """Yield the stored records chunk by chunk (spilled chunks as memory maps)"""
+        with self._lock:
+            chunks = list(self._chunks)
+            current = self._current[:self._current_size].copy() if self._current_size else None
+        for chunk in chunks:
+            yield np.load(chunk, mmap_mode='r') if isinstance(chunk, str) else chunk
+        if current is not None:
+            yield current
+
+    def to_array(self):
+        """All records as one structured array"""
+        chunks = list(self.iter_chunks())
+        if not chunks:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(chunks)
+
+    def column(self, name):
+        """All values of one field"""
+        chunks = [np.asarray(chunk[name]) for chunk in self.iter_chunks()]
+        if not chunks:
+            return np.empty(0, dtype=self.dtype[name])
+        return np.concatenate(chunks)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self._length)
+            if step != 1:
+                return self.to_array()[key]
+            return self._slice(start, stop)
+        index = key + self._length if key < 0 else key
+        if not 0 <= index < self._length:
+            raise IndexError("ResultStore index out of range")
+        row = self._slice(index, index + 1)[0]
+        return {name: row[name].item() for name in self.dtype.names}
+
+    def _slice(self, start, stop):
+        """Records [start, stop) without materializing unrelated chunks"""
+        parts = []
+        offset = 0
+        for chunk in self.iter_chunks():
+            end = offset + len(chunk)
+            if end > start and offset < stop:
+                parts.append(np.asarray(chunk[max(start - offset, 0):min(stop - offset, len(chunk))]))
+            if end >= stop:
+                break
+            offset = end
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    @property
+    def nbytes(self):
+        """Bytes held in memory (spilled chunks excluded)"""
+        with self._lock:
+            current = self._current.nbytes if self._current is not None else 0
+            return current + sum(chunk.nbytes for chunk in self._chunks if isinstance(chunk, np.ndarray))
+
+
+def iter_spilled_chunks(spill_dir, prefix='attempts'):
+    """Yield every spilled chunk in a directory (any process) as a memory map, in file order"""
+    for path in sorted(glob.glob(os.path.join(spill_dir, f'{prefix}_*.npy'))):
+        yield np.load(path, mmap_mode='r')
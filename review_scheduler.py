@@ -0,0 +1,127 @@
+"""
+Spaced-repetition review scheduling.
+
+A learner's missed questions return for review after a number of served
+questions. Each successful review multiplies the interval by `growth`. After
+max_level successful reviews the question leaves the queue, and a failed
+review restarts at the base interval.
+
+Each learner's due items form a binary min-heap in an array('Q') of packed
+64-bit keys: due step (high 32 bits) | review level (8 bits) | question
+index (24 bits). Ordering by key orders by due step, so scheduling and
+popping are O(log n) with 8 bytes of heap per pending review. A dict maps each
+question to its pending key; rescheduled or discarded keys stay in the heap
+and are skipped when they reach the top, so discarding is O(1).
+"""
+from array import array
+
+_LEVEL_SHIFT = 24
+_DUE_SHIFT = 32
+_INDEX_MASK = (1 << _LEVEL_SHIFT) - 1
+_LEVEL_MASK = (1 << (_DUE_SHIFT - _LEVEL_SHIFT)) - 1
+
+
+class ReviewQueue:
+    """Min-heap of packed (due, level, question index) keys for one learner"""
+
+    __slots__ = ('heap', 'live')
+
+    def __init__(self):
+        self.heap = array('Q')
+        # question index -> its pending key; heap keys not in here are stale and skipped lazily
+        self.live = {}
+
+    def __len__(self):
+        return len(self.live)
+
+    def push(self, due, level, question_index):
+        """Schedule a review, replacing any pending review of the same question"""
+        key = (due << _DUE_SHIFT) | (level << _LEVEL_SHIFT) | question_index
+        self.live[question_index] = key
+        heap = self.heap
+        heap.append(key)
+        # Sift the new key up
+        pos = len(heap) - 1
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if heap[parent] <= key:
+                break
+            heap[pos] = heap[parent]
+            pos = parent
+        heap[pos] = key
+        if len(heap) > 2 * len(self.live) + 16:
+            self._compact()
+
+    def _compact(self):
+        """Rebuild the heap from the live keys (a sorted array is a valid heap)"""
+        self.heap = array('Q', sorted(self.live.values()))
+
+    def _pop_key(self):
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        if heap:
+            # Sift the former last key down from the root
+            size = len(heap)
+            pos = 0
+            while True:
+                child = 2 * pos + 1
+                if child >= size:
+                    break
+                if child + 1 < size and heap[child + 1] < heap[child]:
+                    child += 1
+                if heap[child] >= last:
+                    break
+                heap[pos] = heap[child]
+                pos = child
+            heap[pos] = last
+        return top
+
+    def _drop_stale(self):
+        """Pop discarded or superseded keys off the top of the heap"""
+        heap, live = self.heap, self.live
+        while heap and live.get(heap[0] & _INDEX_MASK) != heap[0]:
+            self._pop_key()
+
+    def peek_due(self):
+        """Due step of the earliest item (None when empty)"""
+        self._drop_stale()
+        return self.heap[0] >> _DUE_SHIFT if self.heap else None
+
+    def pop(self):
+        """Remove the earliest item; returns (due, level, question_index)"""
+        self._drop_stale()
+        top = self._pop_key()
+        del self.live[top & _INDEX_MASK]
+        return top >> _DUE_SHIFT, (top >> _LEVEL_SHIFT) & _LEVEL_MASK, top & _INDEX_MASK
+
+    def discard(self, question_index):
+        """Drop any pending review of a question (its heap key is skipped when it surfaces)"""
+        self.live.pop(question_index, None)
+
+
+class ReviewScheduler:
+    """Interval policy shared by every learner's ReviewQueue"""
+
+    def __init__(self, base_interval=3, growth=2, max_level=4):
+        self.base_interval = base_interval
+        self.growth = growth
+        self.max_level = max_level
+
+    def interval(self, level):
+        return self.base_interval * self.growth ** level
+
+    def record(self, queue, question_index, correct, now, level=None):
+        """Schedule the next review after an answer (level is None for questions not served as a review)"""
+        if not correct:
+            queue.push(now + self.interval(0), 0, question_index)
+        elif level is not None and level + 1 < self.max_level:
+            queue.push(now + self.interval(level + 1), level + 1, question_index)
+
+    def next_due(self, queue, now):
+        """Pop the earliest review due at or before now; returns (question_index, level) or None"""
+        due = queue.peek_due()
+        if due is None or due > now:
+            return None
+        _, level, question_index = queue.pop()
+        return question_index, level
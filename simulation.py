@@ -0,0 +1,193 @@
+"""
+Vectorized Monte-Carlo simulation of learners answering adaptive questions.
+
+Runs a difficulty policy (see difficulty_policies.py, by default the rules of
+UCBDifficultyAgent) for many synthetic learners at once: every step draws one
+Bernoulli outcome per learner and updates every learner's slot with array
+operations, instead of calling UCBTrainer.train_step once per answer. Results are stored column-wise
+(one array per field, shape (n_steps, n_learners)) so they can be aggregated
+with vectorized operations.
+
+Example:
+    result = simulate(n_learners=1_000_000, n_steps=50, profile='logistic', seed=0)
+    result.accuracy_by_difficulty()
+"""
+import numpy as np
+
+from difficulty_policies import DifficultyPolicy, make_policy
+
+# Default correctness per difficulty, as in UCBTrainer.train_step
+DEFAULT_CORRECT_PROBS = np.array([0.8, 0.5, 0.3])
+
+
+def _logit(p):
+    return np.log(p / (1 - p))
+
+
+def make_ability_profile(profile, n_learners, rng, n_difficulties=3, **params):
+    """Return per-learner correctness probabilities, shape (n_learners, n_difficulties).
+
+    Profiles:
+      'default'   every learner uses DEFAULT_CORRECT_PROBS (train_step's behaviour)
+      'logistic'  ability ~ Normal(mean, std) shifted onto the default logits, so
+                  ability 0 reproduces the default probabilities
+      'uniform'   independent Uniform(low, high) probabilities, sorted so harder
+                  tiers are never easier
+      array-like  explicit probabilities of shape (n_difficulties,) or
+                  (n_learners, n_difficulties)
+    """
+    base = DEFAULT_CORRECT_PROBS[:n_difficulties]
+    if isinstance(profile, str):
+        if profile == 'default':
+            return np.broadcast_to(base, (n_learners, n_difficulties)).copy()
+        if profile == 'logistic':
+            ability = rng.normal(params.get('mean', 0.0), params.get('std', 1.0), size=(n_learners, 1))
+            return 1.0 / (1.0 + np.exp(-(ability + _logit(base))))
+        if profile == 'uniform':
+            probs = rng.uniform(params.get('low', 0.05), params.get('high', 0.95), size=(n_learners, n_difficulties))
+            return -np.sort(-probs, axis=1)
+        raise ValueError(f"Unknown ability profile: {profile}")
+
+    probs = np.asarray(profile, dtype=np.float64)
+    return np.broadcast_to(probs, (n_learners, n_difficulties)).copy()
+
+
+class SimulationResult:
+    """Columnar simulation output; every history array has shape (n_steps, n_learners)"""
+
+    def __init__(self, difficulty, is_correct, consecutive_correct, correct_probs, policy,
+                 question_index=None, catalog=None):
+        self.difficulty = difficulty
+        self.is_correct = is_correct
+        self.consecutive_correct = consecutive_correct
+        self.question_index = question_index
+        self.catalog = catalog
+        self.correct_probs = correct_probs
+        self.policy = policy
+
+    @property
+    def n_steps(self):
+        return self.difficulty.shape[0]
+
+    @property
+    def n_learners(self):
+        return self.difficulty.shape[1]
+
+    def accuracy_by_difficulty(self):
+        """Share of correct answers at each difficulty (nan if never selected)"""
+        n_difficulties = self.policy.n_difficulties
+        attempts = np.bincount(self.difficulty.ravel(), minlength=n_difficulties)
+        correct = np.bincount(self.difficulty.ravel(), weights=self.is_correct.ravel(), minlength=n_difficulties)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return correct / attempts
+
+    def selection_share(self):
+        """Share of all steps spent at each difficulty"""
+        counts = np.bincount(self.difficulty.ravel(), minlength=self.policy.n_difficulties)
+        return counts / counts.sum()
+
+    def time_to_difficulty(self, difficulty):
+        """First step at which each learner was served the difficulty or a harder one (-1 if never)"""
+        reached = self.difficulty >= difficulty
+        first = np.argmax(reached, axis=0)
+        return np.where(reached.any(axis=0), first, -1)
+
+    def target_level(self, target_rate=0.6):
+        """Hardest difficulty each learner answers correctly with probability >= target_rate (0 if none)"""
+        ok = self.correct_probs >= target_rate
+        hardest = self.correct_probs.shape[1] - 1 - np.argmax(ok[:, ::-1], axis=1)
+        return np.where(ok.any(axis=1), hardest, 0)
+
+    def time_to_level(self, target_rate=0.6):
+        """First step at which each learner was served their target level or harder (n_steps if never)"""
+        reached = self.difficulty >= self.target_level(target_rate)[None, :]
+        return np.where(reached.any(axis=0), np.argmax(reached, axis=0), self.n_steps)
+
+    def frustration(self, run_length=3):
+        """Per learner, the number of answers that ended a run of at least run_length wrong answers"""
+        run = np.zeros(self.n_learners, dtype=np.int32)
+        frustrated = np.zeros(self.n_learners, dtype=np.int32)
+        for step in range(self.n_steps):
+            run = np.where(self.is_correct[step], 0, run + 1)
+            frustrated += run >= run_length
+        return frustrated
+
+    def regret(self):
+        """Cumulative expected regret per learner against their best difficulty"""
+        chosen = np.take_along_axis(self.correct_probs.T, self.difficulty.astype(np.intp), axis=0)
+        best = self.correct_probs.max(axis=1)
+        return (best[None, :] - chosen).sum(axis=0)
+
+    def to_records(self, learner):
+        """One learner's history in UCBTrainer.results form"""
+        records = []
+        for step in range(self.n_steps):
+            is_correct = bool(self.is_correct[step, learner])
+            question_id = None
+            if self.question_index is not None:
+                question_id = self.catalog.ids[self.question_index[step, learner]]
+            records.append({
+                'question_id': question_id,
+                'difficulty': int(self.difficulty[step, learner]),
+                'is_correct': is_correct,
+                'reward': 1.0 if is_correct else 0.0,
+                'consecutive_correct': int(self.consecutive_correct[step, learner])
+            })
+        return records
+
+
+def simulate(n_learners, n_steps, profile='default', exploration_param=None, n_difficulties=3,
+             seed=None, catalog=None, record_questions=False, policy='agent', policy_params=None,
+             **profile_params):
+    """Simulate n_learners answering n_steps adaptive questions each.
+
+    policy is a registered policy name (built with policy_params) or a
+    DifficultyPolicy instance; learner i uses slot i. exploration_param may be
+    a scalar or one value per learner.
+
+    With a catalog and record_questions=True, a question is drawn uniformly from
+    the selected tier for every answer (as train_step does) and its dense index
+    is recorded.
+    """
+    rng = np.random.default_rng(seed)
+    correct_probs = make_ability_profile(profile, n_learners, rng, n_difficulties, **profile_params)
+    if not isinstance(policy, DifficultyPolicy):
+        params = dict(policy_params or {})
+        if exploration_param is not None:
+            params['exploration_param'] = exploration_param
+        policy = make_policy(policy, n_difficulties=n_difficulties, capacity=n_learners, **params)
+        if hasattr(policy, 'rng'):
+            policy.rng = rng
+    policy.resize(n_learners)
+
+    difficulty = np.empty((n_steps, n_learners), dtype=np.int8)
+    is_correct = np.empty((n_steps, n_learners), dtype=bool)
+    consecutive_correct = np.empty((n_steps, n_learners), dtype=np.int16)
+    question_index = None
+    if catalog is not None and record_questions:
+        question_index = np.empty((n_steps, n_learners), dtype=np.int32)
+        tier_sizes = np.array([catalog.tier_size(d) for d in range(n_difficulties)])
+
+    rows = np.arange(n_learners)
+    streak = np.zeros(n_learners, dtype=np.int16)
+    for step in range(n_steps):
+        chosen = policy.select(rows)
+        # Batched Bernoulli draw with each learner's probability at the chosen difficulty
+        correct = rng.random(n_learners) < correct_probs[rows, chosen]
+        policy.update(rows, chosen, correct)
+
+        difficulty[step] = chosen
+        is_correct[step] = correct
+        if 'consecutive_correct' in policy.state:
+            consecutive_correct[step] = policy.state['consecutive_correct'][:n_learners]
+        else:
+            streak = np.where(correct, streak + 1, 0).astype(np.int16)
+            consecutive_correct[step] = streak
+        if question_index is not None:
+            offsets = (rng.random(n_learners) * tier_sizes[chosen]).astype(np.int32)
+            for d in range(n_difficulties):
+                at_d = chosen == d
+                question_index[step, at_d] = catalog.tier_indices[d][offsets[at_d]]
+
+    return SimulationResult(difficulty, is_correct, consecutive_correct, correct_probs, policy,
+                            question_index, catalog)
@@ -0,0 +1,177 @@
+"""
+Coalescing of identical concurrent calls ("singleflight").
+
+When a class submits the same fix to the same question at once, every
+request would otherwise make its own grading call. SingleFlight.do(key, fn)
+runs fn once per key among concurrent callers:
+
+  - within a worker, the first caller (the leader) runs fn and the others
+    wait on its result;
+  - across workers (when SINGLEFLIGHT_DIR is set), the leader also holds an
+    fcntl lock on a file named after the key while it runs fn, and
+    publishes a non-None result to a small JSON file. A leader in another
+    worker that finds the lock held polls it for up to WAIT_TIMEOUT seconds,
+    then reuses the result if it is younger than SINGLEFLIGHT_TTL instead of
+    calling fn again. On timeout it calls fn uncoalesced.
+
+Results are only shared while a call is in flight (plus the TTL window
+across workers); this is not a cache.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_DIR = os.environ.get('SINGLEFLIGHT_DIR')
+SINGLEFLIGHT_TTL = float(os.environ.get('SINGLEFLIGHT_TTL', '30'))
+WAIT_TIMEOUT = 60  # Seconds a follower waits for the leader before calling fn itself
+LOCK_POLL_INTERVAL = 0.05
+
+
+def make_key(*parts):
+    """Hex digest identifying a call from its (string) parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time and hands its result to every concurrent caller"""
+
+    def __init__(self, directory=SINGLEFLIGHT_DIR, ttl=SINGLEFLIGHT_TTL, name='default'):
+        self.directory = directory
+        self.ttl = ttl
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def do(self, key, fn):
+        """Result of fn(), shared with concurrent callers of the same key"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(WAIT_TIMEOUT):
+                metrics.inc('singleflight_total', flight=self.name, role='follower')
+                return call.result
+            metrics.inc('singleflight_total', flight=self.name, role='timeout')
+            return fn()
+
+        try:
+            call.result = self._run_shared(key, fn) if self.directory else self._run(fn)
+            return call.result
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, fn):
+        metrics.inc('singleflight_total', flight=self.name, role='leader')
+        return fn()
+
+    def _result_path(self, key):
+        return os.path.join(self.directory, f"{self.name}.{key}.json")
+
+    def _read_result(self, key):
+        """Result another worker published within the TTL, or None"""
+        try:
+            with open(self._result_path(key), 'r') as f:
+                published = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - published['time'] > self.ttl:
+            return None
+        return published['result']
+
+    def _acquire(self, lock_file):
+        """Take the key's lock, polling for at most WAIT_TIMEOUT seconds"""
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def _run_shared(self, key, fn):
+        """Run fn under a per-key cross-worker lock, reusing a result another worker just published"""
+        lock_path = os.path.join(self.directory, f"{self.name}.{key}.lock")
+        try:
+            lock_file = open(lock_path, 'a')
+        except OSError as e:
+            logger.warning(f"Singleflight lock unavailable, running uncoalesced: {e}")
+            return self._run(fn)
+
+        with lock_file:
+            if not self._acquire(lock_file):
+                metrics.inc('singleflight_total', flight=self.name, role='timeout')
+                return fn()
+            try:
+                # Mark the lock as in use so the sweep leaves it alone
+                with contextlib.suppress(OSError):
+                    os.utime(lock_path)
+                result = self._read_result(key)
+                if result is not None:
+                    metrics.inc('singleflight_total', flight=self.name, role='shared')
+                    return result
+                result = self._run(fn)
+                if result is not None:
+                    self._publish(key, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _publish(self, key, result):
+        path = self._result_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'time': time.time(), 'result': result}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError) as e:
+            logger.warning(f"Singleflight result not published: {e}")
+        self._sweep()
+
+    def _sweep(self):
+        """Remove expired result files and idle lock files (at most once per TTL)"""
+        now = time.time()
+        if now - self._last_sweep < self.ttl:
+            return
+        self._last_sweep = now
+        prefix = f"{self.name}."
+        try:
+            for entry in os.scandir(self.directory):
+                if not entry.name.startswith(prefix):
+                    continue
+                age = now - entry.stat().st_mtime
+                if ((entry.name.endswith('.json') and age > self.ttl)
+                        or (entry.name.endswith('.lock') and age > self.ttl + WAIT_TIMEOUT)):
+                    os.unlink(entry.path)
+        except OSError:
+            pass
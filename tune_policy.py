@@ -0,0 +1,170 @@
+"""
+Auto-tuning of difficulty policy parameters by parallel simulation.
+
+Searches a grid of exploration parameters and streak thresholds (up_after /
+down_after) for a policy. Each candidate runs through policy_eval.evaluate,
+which simulates sharded learner populations on a process pool. Candidates
+are compared on two objectives, both to be minimized:
+
+  - learning speed: mean steps until a learner is first served their
+    target level,
+  - frustration: share of answers that were the third (or later) wrong
+    answer in a row.
+
+The tool prints the Pareto front and writes a config for the server:
+  {"policy": ..., "params": {...}, "metrics": {...}, "pareto_front": [...]}
+The server loads it at start when POLICY_CONFIG points to the file. The
+recommended point is the front member with the smallest sum of both
+objectives normalized over the front.
+
+Usage:
+  python tune_policy.py --policy rules --up-after 1,2,3 --down-after 1,2,3 --output policy_config.json
+  python tune_policy.py --policy agent --exploration 0.5,1,1.414,2 --up-after 2,3 --down-after 2,3,4
+  python tune_policy.py --policy ucb1 --exploration 0.5,1,1.414,2
+"""
+import argparse
+import inspect
+import itertools
+import json
+import time
+
+import numpy as np
+
+from difficulty_policies import POLICIES
+from policy_eval import evaluate, json_safe
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',')] if text else []
+
+
+def _ints(text):
+    return [int(v) for v in text.split(',')] if text else []
+
+
+def make_grid(policy, explorations=(), up_afters=(), down_afters=(), base_params=None):
+    """Policy parameter dicts for every combination of the given values"""
+    axes = [('exploration_param', explorations), ('up_after', up_afters), ('down_after', down_afters)]
+    axes = [(name, values) for name, values in axes if values]
+    grid = []
+    for values in itertools.product(*(values for _, values in axes)):
+        params = dict(base_params or {})
+        params.update(zip((name for name, _ in axes), values))
+        grid.append(params)
+    return grid or [dict(base_params or {})]
+
+
+def pareto_front(points):
+    """Indices of the points not dominated on (time_to_level, frustration), both minimized"""
+    points = np.asarray(points, dtype=np.float64)
+    front = []
+    for i, point in enumerate(points):
+        dominated = np.any(np.all(points <= point, axis=1) & np.any(points < point, axis=1))
+        if not dominated:
+            front.append(i)
+    return sorted(front, key=lambda i: tuple(points[i]))
+
+
+def recommend(points, front):
+    """Front member with the smallest sum of objectives normalized over the front"""
+    values = np.asarray(points, dtype=np.float64)[front]
+    span = np.where(values.max(axis=0) > values.min(axis=0), values.max(axis=0) - values.min(axis=0), 1.0)
+    normalized = (values - values.min(axis=0)) / span
+    return front[int(np.argmin(normalized.sum(axis=1)))]
+
+
+def tune(policy, grid, n_learners=50000, n_steps=50, profile='logistic', profile_params=None,
+         output_dir='eval_results/tuning', shard_size=10000, seed=0, max_workers=None):
+    """Evaluate every parameter set; returns (summaries, pareto front indices, recommended index)"""
+    configs = []
+    for params in grid:
+        params = dict(params)
+        config = {'policy': policy, 'profile': profile, 'profile_params': profile_params or {},
+                  'n_learners': n_learners, 'n_steps': n_steps}
+        if 'exploration_param' in params:
+            config['exploration_param'] = params.pop('exploration_param')
+        config['policy_params'] = params
+        configs.append(config)
+
+    summaries = evaluate(configs, output_dir, shard_size, seed, max_workers)
+    points = [(s['mean_time_to_level'], s['frustration']) for s in summaries]
+    front = pareto_front(points)
+    return summaries, front, recommend(points, front)
+
+
+def _params_of(config):
+    params = dict(config['policy_params'])
+    if 'exploration_param' in config:
+        params['exploration_param'] = config['exploration_param']
+    return params
+
+
+def make_config(summaries, front, best):
+    """Server config for the recommended parameters, with the front for reference"""
+    def entry(summary):
+        return {
+            'params': _params_of(summary['config']),
+            'mean_time_to_level': summary['mean_time_to_level'],
+            'frustration': summary['frustration'],
+        }
+
+    chosen = summaries[best]
+    return {
+        'policy': chosen['config']['policy'],
+        'params': _params_of(chosen['config']),
+        'metrics': {
+            'mean_time_to_level': chosen['mean_time_to_level'],
+            'frustration': chosen['frustration'],
+            'mean_regret': chosen['mean_regret'],
+            'profile': chosen['config']['profile'],
+        },
+        'pareto_front': [entry(summaries[i]) for i in front],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune difficulty policy parameters by simulation")
+    parser.add_argument('--policy', default='rules', help=f"Policy to tune: {', '.join(POLICIES)}")
+    parser.add_argument('--exploration', default='', help='Comma-separated exploration_param values')
+    parser.add_argument('--up-after', default='', help='Comma-separated up_after values (streak policies only)')
+    parser.add_argument('--down-after', default='', help='Comma-separated down_after values (streak policies only)')
+    parser.add_argument('--policy-params', default='{}', help='JSON parameters shared by every candidate')
+    parser.add_argument('--profile', default='logistic', help='Ability profile (default, logistic, uniform)')
+    parser.add_argument('--learners', type=int, default=50000, help='Learners per candidate')
+    parser.add_argument('--steps', type=int, default=50, help='Answers per learner')
+    parser.add_argument('--shard-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None, help='Processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='policy_config.json', help='Config file for POLICY_CONFIG')
+    args = parser.parse_args()
+
+    if args.policy not in POLICIES:
+        parser.error(f"unknown policy '{args.policy}'. Available: {', '.join(POLICIES)}")
+    accepted = inspect.signature(POLICIES[args.policy]).parameters
+    for option, values, name in (('--exploration', args.exploration, 'exploration_param'),
+                                 ('--up-after', args.up_after, 'up_after'),
+                                 ('--down-after', args.down_after, 'down_after')):
+        if values and name not in accepted:
+            parser.error(f"{option} does not apply to policy '{args.policy}'")
+
+    grid = make_grid(args.policy, _floats(args.exploration), _ints(args.up_after), _ints(args.down_after),
+                     json.loads(args.policy_params))
+    start = time.perf_counter()
+    summaries, front, best = tune(args.policy, grid, args.learners, args.steps, args.profile,
+                                  shard_size=args.shard_size, seed=args.seed, max_workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{len(grid)} candidates x {args.learners} learners in {elapsed:.1f}s. Pareto front:")
+    print(f"{'t->level':>9} {'frustration':>12}  params")
+    for i in front:
+        marker = '  <- recommended' if i == best else ''
+        print(f"{summaries[i]['mean_time_to_level']:>9.2f} {summaries[i]['frustration']:>12.4f}  "
+              f"{json.dumps(_params_of(summaries[i]['config']))}{marker}")
+
+    with open(args.output, 'w') as f:
+        json.dump(json_safe(make_config(summaries, front, best)), f, indent=4, allow_nan=False)
+    print(f"\nConfig written to {args.output} (load with POLICY_CONFIG={args.output})")
+
+
+if __name__ == '__main__':
+    main()